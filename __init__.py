@@ -6,6 +6,8 @@ from .nodes.streetview_pano_loader import StreetViewPanoLoader
 from .nodes.streetview_animator import StreetViewAnimator
 from .nodes.streetview_cubemap_loader import StreetViewCubemapLoader
 from .nodes.streetview_equirectangular_loader import StreetViewEquirectangularLoader
+from .nodes.streetview_batch_loader import StreetViewBatchLoader
+from .nodes.streetview_route_walkthrough import StreetViewRouteWalkthrough
 
 NODE_CLASS_MAPPINGS = {
     "StreetViewLoader": StreetViewLoader,
@@ -14,6 +16,8 @@ NODE_CLASS_MAPPINGS = {
     "StreetViewAnimator": StreetViewAnimator,
     "StreetViewCubemapLoader": StreetViewCubemapLoader,
     "StreetViewEquirectangularLoader": StreetViewEquirectangularLoader,
+    "StreetViewBatchLoader": StreetViewBatchLoader,
+    "StreetViewRouteWalkthrough": StreetViewRouteWalkthrough,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
@@ -23,6 +27,8 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "StreetViewAnimator": "Street View Animator",
     "StreetViewCubemapLoader": "Street View Cubemap Loader",
     "StreetViewEquirectangularLoader": "Street View Equirectangular Loader",
+    "StreetViewBatchLoader": "Street View Batch Loader",
+    "StreetViewRouteWalkthrough": "Street View Route Walkthrough",
 }
 
 print("------------------------------------------")
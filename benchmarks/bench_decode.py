@@ -0,0 +1,147 @@
+# file: ComfyUI_StreetView-Loader/benchmarks/bench_decode.py
+"""
+Microbenchmark for the JPEG -> ComfyUI tensor conversion of one 640x640 frame.
+
+Compares the conversion previously copied into every node (PIL decode, convert,
+np.array, astype, divide, from_numpy) with the shared path in utils/image_utils.py.
+
+The number of full-size buffers each path allocates is measured, not assumed:
+every path converts one --memory-size frame in a fresh process, and the growth
+of the peak resident memory during that call (the returned tensor included) is
+reported in units of one uint8 RGB frame. On Linux the peak (VmHWM) is reset
+right before the call through /proc/self/clear_refs, so it covers the buffers
+of every allocator (PIL, OpenCV, numpy, torch). Elsewhere tracemalloc is used
+instead, which only sees numpy and OpenCV allocations.
+
+Usage:
+    python benchmarks/bench_decode.py [--iterations 200] [--size 640] [--memory-size 2048]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.image_utils import decode_image_bytes, image_to_tensor  # noqa: E402
+
+PROC_STATUS = "/proc/self/status"
+PROC_CLEAR_REFS = "/proc/self/clear_refs"
+
+
+def make_test_jpeg(size):
+    """ A deterministic, detailed test image so the decoder does realistic work. """
+    y, x = np.mgrid[0:size, 0:size]
+    image = np.stack([(x * 255 // size), (y * 255 // size), ((x ^ y) & 0xFF)], axis=-1).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(image).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def legacy_path(content):
+    image = Image.open(BytesIO(content)).convert("RGB")
+    image_np = np.array(image).astype(np.float32) / 255.0
+    return torch.from_numpy(image_np)[None,]
+
+
+def shared_path(content, out=None):
+    return image_to_tensor(decode_image_bytes(content), out=out)
+
+
+def peak_rss_supported():
+    return os.access(PROC_CLEAR_REFS, os.W_OK)
+
+
+def _peak_rss_bytes(reset=False):
+    """ Returns the peak resident memory (VmHWM) of this process, after resetting it to the current size if asked. """
+    if reset:
+        with open(PROC_CLEAR_REFS, "w") as f:
+            f.write("5")
+    with open(PROC_STATUS) as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+
+
+def measure_peak_bytes(path_name, content):
+    """
+    Runs in a fresh process: converts the JPEG `content` with the named path
+    ("legacy", "shared" or "shared_out") and returns the bytes allocated at the peak of that call.
+    """
+    # Load the decoders with a tiny frame, so only the measured call is large
+    (legacy_path if path_name == "legacy" else shared_path)(make_test_jpeg(16))
+
+    if path_name == "legacy":
+        convert = legacy_path
+    elif path_name == "shared":
+        convert = shared_path
+    else:
+        # The batch slot exists before the call, as the nodes allocate their batch once
+        height, width = decode_image_bytes(content).shape[:2]
+        out = torch.zeros((height, width, 3), dtype=torch.float32)
+        convert = lambda data: shared_path(data, out=out)  # noqa: E731
+
+    if not peak_rss_supported():
+        tracemalloc.start()
+        result = convert(content)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    before = _peak_rss_bytes(reset=True)
+    result = convert(content)  # kept alive until the peak is read: the returned tensor counts
+    return _peak_rss_bytes() - before
+
+
+def time_per_frame(func, iterations):
+    func()  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--size", type=int, default=640)
+    parser.add_argument("--memory-size", type=int, default=2048, help="frame size of the peak memory measurement")
+    args = parser.parse_args()
+
+    content = make_test_jpeg(args.size)
+    batch = torch.empty((1, args.size, args.size, 3), dtype=torch.float32)
+
+    # Both paths must produce (nearly) the same pixels; decoders may differ by a few levels
+    difference = (legacy_path(content) - shared_path(content)).abs().max().item()
+
+    # Each measurement needs a clean peak memory counter, so it runs in its own process
+    # (the test JPEG is built here, as building it raises the peak far more than a conversion)
+    memory_content = make_test_jpeg(args.memory_size)
+    with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        peaks = {name: pool.apply(measure_peak_bytes, (name, memory_content)) for name in ("legacy", "shared", "shared_out")}
+    frame_bytes = args.memory_size * args.memory_size * 3
+
+    results = [
+        ("legacy (PIL + astype + divide)", peaks["legacy"], time_per_frame(lambda: legacy_path(content), args.iterations)),
+        ("shared (cv2 + single pass)", peaks["shared"], time_per_frame(lambda: shared_path(content), args.iterations)),
+        ("shared, into preallocated slice", peaks["shared_out"], time_per_frame(lambda: shared_path(content, out=batch[0]), args.iterations)),
+    ]
+
+    print(f"Decode-to-tensor, {args.size}x{args.size} JPEG ({len(content)} bytes), {args.iterations} iterations")
+    print(f"Max abs difference between paths: {difference:.4f}")
+    method = "peak RSS growth" if peak_rss_supported() else "tracemalloc peak, numpy/OpenCV only"
+    print(f"Peak memory of one {args.memory_size}x{args.memory_size} conversion ({method}), in uint8 frames of {frame_bytes / 2**20:.1f} MB")
+    print(f"{'path':<34}{'peak MB':>10}{'frames':>10}{'ms/frame':>12}")
+    for name, peak, ms in results:
+        print(f"{name:<34}{peak / 2**20:>10.1f}{peak / frame_bytes:>10.1f}{ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# file: ComfyUI_StreetView-Loader/benchmarks/bench_nodes.py
+"""
+End-to-end throughput benchmark of every node against the local stand-in server.
+
+No Google key is needed: a stub server (benchmarks/stub_server.py) is started on a
+free port and the package is pointed at it through STREETVIEW_API_BASE_URL. The
+disk and memory caches are disabled so every iteration does the full work.
+
+For every node and concurrency level it reports frames/sec and the p50/p99 latency
+of one node execution, plus the HTTP stage timings from utils/metrics.py, and
+writes everything to a JSON file that can be compared against an earlier run.
+
+The concurrency level is passed as the node's max_concurrency input. The Street View
+Loader has no such input, so that many loader executions run at the same time instead.
+
+Before benchmarking, the equirectangular face orientation is checked against the
+original PIL fix-ups (benchmarks/check_face_orientation.py); on a mismatch nothing
+is benchmarked and the exit status is 1.
+
+Usage:
+    python benchmarks/bench_nodes.py [--nodes loader animator cubemap equirect pano]
+                                     [--concurrency 1 4 8] [--iterations 5]
+                                     [--latency-ms 80] [--output bench_results.json]
+                                     [--compare previous_results.json]
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from check_face_orientation import check_face_orientation
+from stub_server import add_fault_arguments, config_from_args, start_stub_server
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "streetview_loader_bench"
+
+
+def import_package():
+    """ Imports the node package from its (hyphenated) folder under a valid module name. """
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME, os.path.join(REPO_DIR, "__init__.py"), submodule_search_locations=[REPO_DIR]
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = package
+    spec.loader.exec_module(package)
+    return package
+
+
+def location_for(iteration):
+    """ A distinct location per iteration, so the metadata lookup cache never hides work. """
+    return f"{40.7200 + iteration * 0.0001:.6f},-73.988354"
+
+
+# name -> (node class name, function building the node inputs for (iteration, concurrency))
+NODE_CASES = {
+    "loader": ("StreetViewLoader", lambda i, c: dict(
+        location=location_for(i), heading=151.78, pitch=0.0, fov=90, aspect_ratio="1:1 Square (640x640)")),
+    "animator": ("StreetViewAnimator", lambda i, c: dict(
+        location=location_for(i), start_heading=0.0, end_heading=90.0, start_pitch=0.0, end_pitch=0.0,
+        start_fov=90, end_fov=90, duration=1.0, fps=24, aspect_ratio="1:1 Square (640x640)",
+        interpolation="linear", max_concurrency=c)),
+    "cubemap": ("StreetViewCubemapLoader", lambda i, c: dict(
+        location=location_for(i), face_resolution="512x512", output_mode="merged_cross", max_concurrency=c)),
+    "equirect": ("StreetViewEquirectangularLoader", lambda i, c: dict(
+        location=location_for(i), face_resolution="640x640", upscale_factor=1, upscale_method="BILINEAR",
+        interpolation_mode="BILINEAR", max_concurrency=c)),
+    "pano": ("StreetViewPanoLoader", lambda i, c: dict(
+        location=location_for(i), center_heading=0.0, pitch=0.0, fov_per_image=90, num_images=3,
+        overlap_percentage=30, max_concurrency=c)),
+}
+
+
+def percentile_ms(values, q):
+    return float(np.percentile(values, q) * 1000.0) if values else 0.0
+
+
+def http_summary(snapshot):
+    """ Totals of the HTTP-related metrics recorded during one benchmark case. """
+    summary = {}
+    for timer in snapshot["timers"]:
+        if timer["name"] in ("http_wait", "http_transfer", "decode", "tensor", "reproject", "stitch"):
+            entry = summary.setdefault(timer["name"], {"count": 0, "p50_ms": 0.0, "p99_ms": 0.0})
+            entry["count"] += timer["count"]
+            entry["p50_ms"] = max(entry["p50_ms"], timer["p50_seconds"] * 1000.0)
+            entry["p99_ms"] = max(entry["p99_ms"], timer["p99_seconds"] * 1000.0)
+    for counter in snapshot["counters"]:
+        if counter["name"] in ("billed_requests", "metadata_requests", "bytes_downloaded", "http_retries"):
+            summary[counter["name"]] = summary.get(counter["name"], 0) + counter["value"]
+    return summary
+
+
+async def run_case(package, metrics, case, concurrency, iterations):
+    class_name, make_inputs = NODE_CASES[case]
+    node = package.NODE_CLASS_MAPPINGS[class_name]()
+    func = getattr(node, node.FUNCTION)
+    parallel = concurrency if case == "loader" else 1
+
+    # Warm-up (imports, projection tables), not measured
+    await func(**make_inputs(-1, concurrency))
+    metrics.reset()
+
+    latencies = []
+    frames = 0
+
+    async def timed(iteration):
+        start = time.perf_counter()
+        outputs = await func(**make_inputs(iteration, concurrency))
+        latencies.append(time.perf_counter() - start)
+        return outputs[0].shape[0]
+
+    start = time.perf_counter()
+    for first in range(0, iterations * parallel, parallel):
+        frames += sum(await asyncio.gather(*(timed(i) for i in range(first, first + parallel))))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "node": class_name,
+        "concurrency": concurrency,
+        "executions": len(latencies),
+        "frames": frames,
+        "seconds": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "latency_p50_ms": percentile_ms(latencies, 50),
+        "latency_p99_ms": percentile_ms(latencies, 99),
+        "stages": http_summary(metrics.snapshot()),
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["node"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print(f"\nComparison with {baseline_path}:")
+    print(f"{'node':<34}{'conc':>6}{'fps before':>12}{'fps now':>10}{'change':>9}")
+    for result in results:
+        before = baseline.get((result["node"], result["concurrency"]))
+        if before is None or before["fps"] <= 0:
+            continue
+        change = (result["fps"] / before["fps"] - 1.0) * 100.0
+        print(f"{result['node']:<34}{result['concurrency']:>6}{before['fps']:>12.2f}{result['fps']:>10.2f}{change:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", nargs="+", choices=list(NODE_CASES), default=list(NODE_CASES))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="A previous results file to compare against")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(config_from_args(args))
+
+    # Must be set before the package is imported: the nodes read the key at import time
+    os.environ.update({
+        "STREETVIEW_API_BASE_URL": base_url,
+        "GOOGLE_STREET_VIEW_API_KEY": "offline-benchmark",
+        "STREETVIEW_DISK_CACHE": "false",
+        "STREETVIEW_MEMORY_CACHE_MB": "0",
+        "STREETVIEW_MAX_QPS": "0",
+        "STREETVIEW_DAILY_BUDGET": "0",
+        "STREETVIEW_METRICS": "true",
+    })
+    os.environ.pop("STREETVIEW_METRICS_FILE", None)
+
+    package = import_package()
+    metrics = sys.modules[f"{PACKAGE_NAME}.utils.metrics"].get_metrics()
+
+    results = []
+    try:
+        # Correctness gate: a wrong face orientation would make every equirect number meaningless
+        failures = check_face_orientation(package)
+        if failures:
+            for failure in failures:
+                print(f"FAIL face orientation: {failure}")
+            return 1
+        for case in args.nodes:
+            for concurrency in args.concurrency:
+                result = asyncio.run(run_case(package, metrics, case, concurrency, args.iterations))
+                results.append(result)
+                print(f"{result['node']:<34} concurrency {concurrency:>2}: {result['fps']:8.2f} fps, "
+                      f"p50 {result['latency_p50_ms']:8.1f} ms, p99 {result['latency_p99_ms']:8.1f} ms")
+    finally:
+        server.shutdown()
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stub": {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate, "rate_429": args.rate_429},
+        "iterations": args.iterations,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# file: ComfyUI_StreetView-Loader/benchmarks/check_face_orientation.py
+"""
+Checks that the equirectangular node's numpy face fix-ups match the original PIL transposes.
+
+The node used to orient every raw API face with PIL (flip left-right, flip
+top-bottom, or flip left-right + ROTATE_270 for the up and down faces). It now
+uses numpy views (orient_face) and, for tiled faces, in-place block transforms
+(orient_face_in_place). This script compares both against the PIL reference,
+face by face and on the final equirectangular image, and exits with status 1
+on any difference. benchmarks/bench_nodes.py runs the same check before it
+benchmarks the nodes and fails with status 1 as well, so the orientation
+cannot regress silently.
+
+Usage:
+    python benchmarks/check_face_orientation.py
+"""
+
+import sys
+
+import numpy as np
+from PIL import Image
+
+# The original PIL fix-ups, per face
+PIL_FIXUPS = {
+    "front": [Image.FLIP_LEFT_RIGHT],
+    "left": [Image.FLIP_LEFT_RIGHT],
+    "right": [Image.FLIP_TOP_BOTTOM],
+    "back": [Image.FLIP_TOP_BOTTOM],
+    "top": [Image.FLIP_LEFT_RIGHT, Image.ROTATE_270],
+    "bottom": [Image.FLIP_LEFT_RIGHT, Image.ROTATE_270],
+}
+
+
+def pil_reference(face_name, image_np):
+    image_pil = Image.fromarray(image_np)
+    for method in PIL_FIXUPS[face_name]:
+        image_pil = image_pil.transpose(method)
+    return np.array(image_pil)
+
+
+def check_face_orientation(package):
+    """ Returns a list of mismatch descriptions (empty when every fix-up matches PIL). """
+    node = package.NODE_CLASS_MAPPINGS["StreetViewEquirectangularLoader"]()
+    rng = np.random.default_rng(0)
+    failures = []
+
+    # Sizes below, at and across the in-place block size, including odd ones
+    for size in (5, 256, 257, 640, 641):
+        raw_faces = {name: rng.integers(0, 256, (size, size, 3), dtype=np.uint8) for name in PIL_FIXUPS}
+        reference = {name: pil_reference(name, face) for name, face in raw_faces.items()}
+        views = {name: np.ascontiguousarray(node.orient_face(name, face)) for name, face in raw_faces.items()}
+        in_place = {name: node.orient_face_in_place(name, face.copy()) for name, face in raw_faces.items()}
+
+        for name in PIL_FIXUPS:
+            for label, faces in (("orient_face", views), ("orient_face_in_place", in_place)):
+                if not np.array_equal(faces[name], reference[name]):
+                    failures.append(f"{label} {name} {size}x{size}")
+
+        if size >= 256:
+            expected = node.cube_to_equirectangular(reference, "BILINEAR")
+            for label, faces in (("orient_face", views), ("orient_face_in_place", in_place)):
+                if not np.array_equal(node.cube_to_equirectangular(faces, "BILINEAR"), expected):
+                    failures.append(f"{label} equirectangular {size}x{size}")
+
+    return failures
+
+
+def main():
+    from bench_nodes import import_package
+
+    failures = check_face_orientation(import_package())
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("Face orientation check: " + ("OK" if not failures else f"{len(failures)} mismatches"))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
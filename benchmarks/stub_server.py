@@ -0,0 +1,224 @@
+# file: ComfyUI_StreetView-Loader/benchmarks/stub_server.py
+"""
+A local stand-in for the Street View Static API, for offline benchmarks.
+
+Serves the two endpoints this package uses:
+    /maps/api/streetview           - a deterministic synthetic JPEG derived from the
+                                     request parameters (same parameters, same bytes)
+    /maps/api/streetview/metadata  - JSON with status, pano_id, date and location
+
+Latency, server errors and 429 responses can be injected to exercise the retry,
+rate limiting and concurrency paths. Any API key is accepted.
+
+Usage:
+    python benchmarks/stub_server.py [--port 8765] [--latency-ms 80] [--jitter-ms 20]
+                                     [--error-rate 0.0] [--rate-429 0.0] [--no-coverage "0,0"]
+
+Then point the package at it (e.g. in .env):
+    STREETVIEW_API_BASE_URL = "http://127.0.0.1:8765/maps/api/streetview"
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+from PIL import Image
+
+IMAGE_PATH = "/maps/api/streetview"
+METADATA_PATH = "/maps/api/streetview/metadata"
+MAX_IMAGE_SIZE = 640
+
+
+class StubConfig:
+    """ Fault injection settings shared by all request handler threads. """
+
+    def __init__(self, latency_ms=80.0, jitter_ms=20.0, error_rate=0.0, rate_429=0.0,
+                 retry_after=0, no_coverage=(), seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.no_coverage = set(no_coverage)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def draw(self):
+        """ Returns (delay_seconds, failure) for the next request; failure is None, 429 or 500. """
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+            roll = self._random.random()
+        if roll < self.rate_429:
+            return delay, 429
+        if roll < self.rate_429 + self.error_rate:
+            return delay, 500
+        return delay, None
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def pano_id_for(params):
+    """ A stable fake pano ID; a pano request resolves to itself, a location to a hash of it. """
+    if params.get("pano"):
+        return params["pano"]
+    location = ",".join(part.strip() for part in params.get("location", "").split(","))
+    return "STUB" + _digest(location)[:18]
+
+
+@functools.lru_cache(maxsize=512)
+def synthetic_jpeg(pano_id, heading, pitch, fov, width, height):
+    """
+    Renders a textured, deterministic image for one view. Neighbouring headings
+    produce overlapping content, so the images look like a continuous scene.
+    """
+    rng = np.random.default_rng(int(_digest(pano_id)[:8], 16))
+    palette = rng.integers(40, 220, size=(4, 3)).astype(np.float32)
+
+    # Horizontal angle (degrees) of every column, and a vertical coordinate per row
+    columns = heading + (np.arange(width, dtype=np.float32) / width - 0.5) * fov
+    rows = pitch + (0.5 - np.arange(height, dtype=np.float32) / height) * fov * height / width
+
+    a = np.radians(columns)[None, :]
+    b = np.radians(rows)[:, None]
+    pattern = np.stack([
+        np.sin(a * 3 + palette[0, 0]) * np.cos(b * 5),
+        np.sin(a * 7 + palette[1, 1]) * np.sin(b * 3),
+        np.cos(a * 11 + b * 13 + palette[2, 2]),
+    ], axis=-1)
+    image = palette[3][None, None, :] + pattern * 35.0
+    image += (np.sin(a * 97)[..., None] * np.cos(b * 89)[..., None]) * 12.0  # fine detail
+    image = np.clip(image, 0, 255).astype(np.uint8)
+
+    buffer = BytesIO()
+    Image.fromarray(image).save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "StreetViewStub/1.0"
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        config = self.server.config
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+
+        delay, failure = config.draw()
+        time.sleep(delay)
+
+        if failure == 429:
+            return self._send(429, b"Too Many Requests", "text/plain", {"Retry-After": str(config.retry_after)})
+        if failure == 500:
+            return self._send(500, b"Internal Server Error", "text/plain")
+
+        location = ",".join(part.strip() for part in params.get("location", "").split(","))
+        covered = params.get("pano") or location not in config.no_coverage
+
+        if url.path.rstrip("/") == METADATA_PATH:
+            if not covered:
+                payload = {"status": "ZERO_RESULTS"}
+            else:
+                lat, _, lng = location.partition(",")
+                payload = {
+                    "status": "OK",
+                    "pano_id": pano_id_for(params),
+                    "date": "2024-06",
+                    "location": {"lat": float(lat or 0.0), "lng": float(lng or 0.0)},
+                    "copyright": "© Stub",
+                }
+            return self._send(200, json.dumps(payload).encode("utf-8"), "application/json")
+
+        if url.path.rstrip("/") != IMAGE_PATH:
+            return self._send(404, b"Not Found", "text/plain")
+
+        if not covered:
+            # The real API answers 404 when return_error_codes=true, otherwise a gray placeholder
+            return self._send(404, b"", "image/jpeg")
+
+        try:
+            width, height = (min(int(v), MAX_IMAGE_SIZE) for v in params.get("size", "640x640").split("x"))
+            content = synthetic_jpeg(
+                pano_id_for(params),
+                float(params.get("heading", 0)),
+                float(params.get("pitch", 0)),
+                float(params.get("fov", 90)),
+                width,
+                height,
+            )
+        except ValueError:
+            return self._send(400, b"Bad Request", "text/plain")
+        self._send(200, content, "image/jpeg")
+
+
+def start_stub_server(config=None, host="127.0.0.1", port=0):
+    """
+    Starts the stand-in server on a background thread.
+
+    Returns:
+        (server, base_url). base_url is the value for STREETVIEW_API_BASE_URL;
+        call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.config = config or StubConfig()
+    threading.Thread(target=server.serve_forever, name="streetview-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}{IMAGE_PATH}"
+
+
+def add_fault_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Uniform latency jitter (+/-)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=0, help="Retry-After seconds sent with 429 responses")
+    parser.add_argument("--no-coverage", action="append", default=[], help="A location without imagery (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def config_from_args(args):
+    return StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_429,
+                      args.retry_after, args.no_coverage, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(config_from_args(args), args.host, args.port)
+    print(f"Street View stub listening. Set STREETVIEW_API_BASE_URL = \"{base_url}\"")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
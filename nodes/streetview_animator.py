@@ -1,13 +1,20 @@
 # file: ComfyUI_StreetView-Loader/nodes/streetview_animator.py
 
+import asyncio
 import torch
-import numpy as np
 import os
 from dotenv import load_dotenv
-from PIL import Image
 
-# Import the refactored API call function from our utility file
-from ..utils.connect_api_utils import fetch_streetview_image
+# Import the async batch fetch engine from our utility file
+from ..utils.async_fetch import ViewRequest, fetch_streetview_batch_async
+from ..utils.connect_api_utils import aspect_ratio_size, normalize_request
+from ..utils.concurrency import map_concurrent_async
+from ..utils.projection import CUBE_FACE_NAMES, CUBE_FACE_ORIENTATIONS, render_perspective_from_cube
+from ..utils.image_utils import allocate_image_batch, image_to_tensor
+from ..utils.pano_metadata import preflight_panorama
+from ..utils.metrics import get_metrics, instrument_node
+from ..utils.fingerprint import plan_fingerprint
+from .streetview_cubemap_loader import StreetViewCubemapLoader
 
 # --- Load API Key from .env file ---
 # This logic finds the .env file in the parent directory (ComfyUI_StreetView-Loader)
@@ -21,6 +28,12 @@ load_dotenv(dotenv_path=dotenv_path)
 # Get the API key from the loaded environment variables
 API_KEY_FROM_ENV = os.getenv("GOOGLE_STREET_VIEW_API_KEY")
 
+# Resolution of the cube faces captured in "render_from_panorama" mode (API maximum)
+PANORAMA_FACE_SIZE = 640
+
+# Cubemap loader names of the up/down faces, whose fetch retries them at a near-vertical pitch
+PANORAMA_FACE_ALIASES = {"top": "up", "bottom": "down"}
+
 
 class StreetViewAnimator:
     """
@@ -66,6 +79,11 @@ class StreetViewAnimator:
             # NEW: Optional input for Historical Date ID (Panorama ID)
             "optional": {
                 "historical_date_id": ("STRING", {"default": "", "multiline": False, "tooltip": "Enter a panorama ID to animate a historical image from a specific date"}),
+                "max_concurrency": ("INT", {"default": 8, "min": 1, "max": 16, "step": 1, "tooltip": "Number of frames fetched at the same time"}),
+                "angular_resolution": ("FLOAT", {"default": 0.1, "min": 0.0, "max": 5.0, "step": 0.05, "tooltip": "Heading and pitch are snapped to multiples of this angle (degrees). Frames with the same snapped view share a single API request. 0 disables snapping."}),
+                "render_mode": (["api_per_frame", "render_from_panorama"], {"default": "api_per_frame", "tooltip": "api_per_frame fetches every distinct frame from the API. render_from_panorama fetches the 6 cube faces once and renders every frame locally."}),
+                "output_precision": (["float32", "float16", "uint8"], {"default": "float32", "tooltip": "Data type of the output batch. float16 halves and uint8 quarters the memory; uint8 holds raw 0-255 values and is only understood by nodes that accept it."}),
+                "memory_backing": (["ram", "memmap"], {"default": "ram", "tooltip": "memmap backs the output batch with a temporary file so very long animations fit in memory"}),
             }
         }
 
@@ -93,29 +111,20 @@ class StreetViewAnimator:
         else:
             return start_val + (end_val - start_val) * (1 - (-2 * progress + 2) ** 2 / 2)
 
-    def animate_streetview(self, location, start_heading, end_heading, start_pitch, end_pitch, start_fov, end_fov, duration, fps, aspect_ratio, interpolation, historical_date_id=""):
-        if not API_KEY_FROM_ENV:
-            raise ValueError("Google Street View API key not found in .env file. Please ensure GOOGLE_STREET_VIEW_API_KEY is set in ComfyUI_StreetView-Loader/.env")
-
-        # Determine width and height based on the selected aspect ratio
-        if aspect_ratio == "1:1 Square (640x640)":
-            width, height = 640, 640
-        elif aspect_ratio == "16:9 Widescreen (640x360)":
-            width, height = 640, 360
-        elif aspect_ratio == "9:16 Vertical (360x640)":
-            width, height = 360, 640
-        elif aspect_ratio == "4:3 Classic (640x480)":
-            width, height = 640, 480
-        elif aspect_ratio == "3:2 Photography (640x427)":
-            width, height = 640, 427
-        else:
-            width, height = 640, 640
+    def quantize_angle(self, value, resolution):
+        """Snap an angle to the nearest multiple of `resolution` degrees (no-op when resolution is 0)."""
+        if resolution <= 0:
+            return value
+        return round(round(value / resolution) * resolution, 6)
 
-        # Calculate total frames based on duration and fps
-        total_frames = int(duration * fps)
-        if total_frames < 1:
-            total_frames = 1
+    def plan_frames(self, location, start_heading, end_heading, start_pitch, end_pitch, start_fov, end_fov, total_frames, interpolation, width, height, historical_date_id="", angular_resolution=0.1):
+        """
+        Computes the view of every frame before anything is fetched.
 
+        Returns:
+            A list of ViewRequest, one per frame. Frames whose quantized views are
+            identical compare equal, so they can be collapsed into one request.
+        """
         # Select interpolation function based on parameter
         interp_func = self.linear_interpolation
         if interpolation == "ease_in":
@@ -125,8 +134,7 @@ class StreetViewAnimator:
         elif interpolation == "ease_in_out":
             interp_func = self.ease_in_out_interpolation
 
-        # Generate frames
-        image_tensors = []
+        views = []
         for frame in range(total_frames):
             progress = frame / (total_frames - 1) if total_frames > 1 else 0.0
 
@@ -145,40 +153,125 @@ class StreetViewAnimator:
                 else:
                     current_heading = start_heading + ((current_heading - start_heading - 180) % 360) + 180
 
+            # Snap heading and pitch to the angular resolution so near-identical frames share one request
+            current_heading = self.quantize_angle(current_heading, angular_resolution)
+            current_pitch = max(-90.0, min(90.0, self.quantize_angle(current_pitch, angular_resolution)))
+
             # Normalize heading to 0-360 range
             current_heading = current_heading % 360
             if current_heading < 0:
                 current_heading += 360
 
-            # Fetch the image for this frame
-            image_pil, metadata = fetch_streetview_image(
-                api_key=API_KEY_FROM_ENV,
+            views.append(ViewRequest(
                 location=location,
-                pano_id=historical_date_id,  # Pass the historical date ID if provided
                 heading=current_heading,
                 pitch=current_pitch,
                 fov=current_fov,
                 width=width,
-                height=height
-            )
+                height=height,
+                pano_id=historical_date_id,  # Pass the historical date ID if provided
+            ))
 
-            # Convert the returned PIL image to the tensor format ComfyUI expects
-            image_tensor = self.pil_to_tensor(image_pil)
-            image_tensors.append(image_tensor)
+        return views
 
-        # Stack all frames into a single tensor
-        if image_tensors:
-            stacked_images = torch.cat(image_tensors, dim=0)
-            metadata = f"Animation: {total_frames} frames, {duration}s at {fps}fps. Parameters: heading ({start_heading:.1f}° to {end_heading:.1f}°), pitch ({start_pitch:.1f}° to {end_pitch:.1f}°), fov ({start_fov} to {end_fov}). Interpolation: {interpolation}"
+    @classmethod
+    def IS_CHANGED(s, location, start_heading, end_heading, start_pitch, end_pitch, start_fov, end_fov, duration, fps, aspect_ratio, interpolation, historical_date_id="", max_concurrency=8, angular_resolution=0.1, render_mode="api_per_frame", output_precision="float32", memory_backing="ram", **kwargs):
+        # The fingerprint covers the planned view of every frame, not the raw slider values
+        width, height = aspect_ratio_size(aspect_ratio)
+        total_frames = max(1, int(duration * fps))
+        views = s().plan_frames(location, start_heading, end_heading, start_pitch, end_pitch, start_fov, end_fov, total_frames, interpolation, width, height, historical_date_id, angular_resolution)
+        plan = {
+            "frames": [normalize_request(*view) for view in views],
+            "render_mode": render_mode,
+            "output_precision": output_precision,
+            "memory_backing": memory_backing,
+        }
+        return plan_fingerprint(plan, pinned=bool(historical_date_id and historical_date_id.strip()))
+
+    def fill_frame_batch(self, batch, views, render_view):
+        """
+        Writes every frame into its slot of the preallocated batch.
+        Each distinct view is rendered/converted once; repeated views copy the first slot.
+        """
+        first_slot = {}
+        for index, view in enumerate(views):
+            if view in first_slot:
+                batch[index].copy_(batch[first_slot[view]])
+            else:
+                first_slot[view] = index
+                image_to_tensor(render_view(view), out=batch[index])
+
+    @instrument_node("StreetViewAnimator")
+    async def animate_streetview(self, location, start_heading, end_heading, start_pitch, end_pitch, start_fov, end_fov, duration, fps, aspect_ratio, interpolation, historical_date_id="", max_concurrency=8, angular_resolution=0.1, render_mode="api_per_frame", output_precision="float32", memory_backing="ram"):
+        if not API_KEY_FROM_ENV:
+            raise ValueError("Google Street View API key not found in .env file. Please ensure GOOGLE_STREET_VIEW_API_KEY is set in ComfyUI_StreetView-Loader/.env")
+
+        # Determine width and height based on the selected aspect ratio
+        width, height = aspect_ratio_size(aspect_ratio)
+
+        # Calculate total frames based on duration and fps
+        total_frames = int(duration * fps)
+        if total_frames < 1:
+            total_frames = 1
+
+        # Free metadata preflight: skip billed requests where there is no imagery and pin every request to one panorama
+        panorama = await asyncio.to_thread(preflight_panorama, API_KEY_FROM_ENV, location, historical_date_id)
+        if panorama.no_coverage:
+            print(f"StreetView Animator: No imagery at {location} ({panorama.status}), skipping all frame requests.")
+            empty_tensor = torch.zeros((total_frames, height, width, 3), dtype=torch.float32)
+            return (empty_tensor, f"Error: No Street View imagery available for this location ({panorama.status}).")
+        pano_id = panorama.pano_id if panorama.ok else historical_date_id
+
+        # Plan the view of every frame, then collapse duplicate views into a single request
+        views = self.plan_frames(location, start_heading, end_heading, start_pitch, end_pitch, start_fov, end_fov, total_frames, interpolation, width, height, pano_id, angular_resolution)
+        unique_views = list(dict.fromkeys(views))
+
+        if render_mode == "render_from_panorama":
+            # One 360° capture: fetch the 6 cube faces, then render every frame locally
+            # Same validated fetch as the cubemap loader: blank placeholders are rejected and the
+            # up/down faces are retried at ±85° pitch; faces that still fail are gray
+            cubemap_loader = StreetViewCubemapLoader()
+
+            def fetch_face(face_name):
+                heading, pitch = CUBE_FACE_ORIENTATIONS[face_name]
+                return cubemap_loader.fetch_face(PANORAMA_FACE_ALIASES.get(face_name, face_name), heading, pitch, location, pano_id, PANORAMA_FACE_SIZE, PANORAMA_FACE_SIZE)
+
+            face_results = await map_concurrent_async(fetch_face, CUBE_FACE_NAMES, max_concurrency)
+            failed_faces = [PANORAMA_FACE_ALIASES.get(name, name) for name, (_, metadata_line) in zip(CUBE_FACE_NAMES, face_results) if metadata_line is None]
+            faces_fetched = len(CUBE_FACE_NAMES) - len(failed_faces)
+            if faces_fetched == 0:
+                empty_tensor = torch.zeros((total_frames, height, width, 3), dtype=torch.float32)
+                return (empty_tensor, "Error: Failed to fetch any cube faces for render_from_panorama mode.")
+
+            faces = [image_np for image_np, _ in face_results]
+            face_metadata = "\n".join(metadata_line for _, metadata_line in face_results if metadata_line is not None)
+
+            def render_view(view):
+                with get_metrics().timer("reproject"):
+                    return render_perspective_from_cube(faces, view.heading, view.pitch, view.fov, view.width, view.height)
+
+            request_summary = f"API requests: {len(CUBE_FACE_NAMES)} cube faces ({faces_fetched}/6 fetched), {len(unique_views)} unique views rendered locally for {total_frames} frames"
+            if failed_faces:
+                request_summary += f". Failed faces (rendered gray): {', '.join(failed_faces)}"
         else:
-            # Fallback to single black image if no frames were generated
-            stacked_images = torch.zeros((1, height, width, 3), dtype=torch.float32)
-            metadata = "Error: No frames were generated for animation"
+            # Fetch the unique views concurrently without blocking the executor; results keep their order
+            results = await fetch_streetview_batch_async(API_KEY_FROM_ENV, unique_views, max_concurrency)
+            unique_images = {view: result.image for view, result in zip(unique_views, results)}
 
-        return (stacked_images, metadata)
+            def render_view(view):
+                return unique_images[view]
 
-    def pil_to_tensor(self, image: Image.Image):
-        """ Helper function to convert a PIL Image to a PyTorch Tensor for ComfyUI. """
-        image_np = np.array(image).astype(np.float32) / 255.0
-        # Add the batch dimension [None,] which is equivalent to unsqueeze(0)
-        return torch.from_numpy(image_np)[None,]
\ No newline at end of file
+            request_summary = f"API requests: {len(unique_views)} unique views for {total_frames} frames (angular resolution {angular_resolution}°)"
+
+        # Preallocate the output batch once and fill every frame in place (CPU bound, off the event loop)
+        stacked_images = allocate_image_batch(total_frames, height, width, output_precision, memmap=(memory_backing == "memmap"))
+        await asyncio.to_thread(self.fill_frame_batch, stacked_images, views, render_view)
+
+        metadata = f"Animation: {total_frames} frames, {duration}s at {fps}fps. Parameters: heading ({start_heading:.1f}° to {end_heading:.1f}°), pitch ({start_pitch:.1f}° to {end_pitch:.1f}°), fov ({start_fov} to {end_fov}). Interpolation: {interpolation}. {request_summary}. Output: {output_precision}, {memory_backing}"
+
+        if panorama.ok:
+            metadata += f"\n{panorama.describe()}"
+        if render_mode == "render_from_panorama":
+            metadata += f"\n{face_metadata}"
+
+        return (stacked_images, metadata)
@@ -0,0 +1,227 @@
+# file: ComfyUI_StreetView-Loader/nodes/streetview_batch_loader.py
+
+import csv
+import json
+import os
+from collections import namedtuple
+from dotenv import load_dotenv
+
+from ..utils.connect_api_utils import fetch_streetview_array, aspect_ratio_size, normalize_request
+from ..utils.concurrency import map_concurrent_async
+from ..utils.rate_limiter import QuotaExceededError
+from ..utils.archive import ArchiveMissError
+from ..utils.image_utils import allocate_image_batch, image_to_tensor
+from ..utils.pano_metadata import preflight_panorama
+from ..utils.metrics import instrument_node
+from ..utils.fingerprint import plan_fingerprint
+
+# --- Load API Key from .env file ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+dotenv_path = os.path.join(parent_dir, '.env')
+load_dotenv(dotenv_path=dotenv_path)
+API_KEY_FROM_ENV = os.getenv("GOOGLE_STREET_VIEW_API_KEY")
+
+# One parsed input row; `error` is set when the row could not be parsed
+BatchRow = namedtuple("BatchRow", ["line", "location", "heading", "pitch", "fov", "pano_id", "error"])
+
+# Accepted header names for each column (CSV with a header row)
+COLUMN_ALIASES = {
+    "location": ("location", "latlng", "lat_lng", "coordinates"),
+    "lat": ("lat", "latitude"),
+    "lng": ("lng", "lon", "long", "longitude"),
+    "heading": ("heading",),
+    "pitch": ("pitch",),
+    "fov": ("fov",),
+    "pano_id": ("pano_id", "pano", "panoid", "historical_date_id"),
+}
+
+
+class StreetViewBatchLoader:
+    """
+    A ComfyUI node that loads many Street View images in one execution.
+
+    Takes a list of rows (one view per line, or CSV with a header) and returns a
+    single IMAGE batch plus per-row metadata. Rows are fetched, decoded and written
+    into the preallocated batch concurrently, so conversions overlap network I/O.
+    A failing row never aborts the batch; it is reported in `failed_rows`.
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "rows": ("STRING", {
+                    "multiline": True,
+                    "default": "lat,lng,heading,pitch,fov,pano_id\n40.720032,-73.988354,151.78,0,90,\n46.6237597,8.0305018,133.44,-5,90,",
+                    "tooltip": "One view per line: lat,lng[,heading[,pitch[,fov[,pano_id]]]]. A CSV header row (lat/lng or location, heading, pitch, fov, pano_id) is also accepted."
+                }),
+                "aspect_ratio": ([
+                    "1:1 Square (640x640)",
+                    "16:9 Widescreen (640x360)",
+                    "9:16 Vertical (360x640)",
+                    "4:3 Classic (640x480)",
+                    "3:2 Photography (640x427)"
+                ],),
+                "default_heading": ("FLOAT", {"default": 0.0, "min": 0, "max": 360, "step": 0.1, "tooltip": "Used for rows without a heading"}),
+                "default_pitch": ("FLOAT", {"default": 0.0, "min": -90, "max": 90, "step": 0.1, "tooltip": "Used for rows without a pitch"}),
+                "default_fov": ("INT", {"default": 90, "min": 10, "max": 120, "step": 1, "tooltip": "Used for rows without a fov"}),
+            },
+            "optional": {
+                "max_concurrency": ("INT", {"default": 8, "min": 1, "max": 16, "step": 1, "tooltip": "Number of rows fetched at the same time"}),
+                "skip_failed": ("BOOLEAN", {"default": False, "tooltip": "Leave failed rows out of the batch. When off, they are kept as black frames so batch indices match row numbers."}),
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE", "STRING", "STRING")
+    RETURN_NAMES = ("images", "metadata", "failed_rows")
+    FUNCTION = "load_batch"
+    CATEGORY = "Ru4ls/StreetView"
+
+    @classmethod
+    def IS_CHANGED(s, rows, aspect_ratio, default_heading, default_pitch, default_fov, max_concurrency=8, skip_failed=False, **kwargs):
+        width, height = aspect_ratio_size(aspect_ratio)
+        parsed_rows = s().parse_rows(rows, default_heading, default_pitch, default_fov)
+        plan = {
+            "rows": [
+                row.error or normalize_request(row.location, row.heading, row.pitch, row.fov, width, height, row.pano_id)
+                for row in parsed_rows
+            ],
+            "skip_failed": skip_failed,
+        }
+        # Only fully pinned batches (every row has a pano ID) are stable indefinitely
+        pinned = bool(parsed_rows) and all(row.pano_id for row in parsed_rows)
+        return plan_fingerprint(plan, pinned)
+
+    def parse_rows(self, text, default_heading, default_pitch, default_fov):
+        """
+        Parses the rows input into BatchRow items (blank lines and lines starting with # are skipped).
+        """
+        lines = [(number, line) for number, line in enumerate(text.splitlines(), start=1)
+                 if line.strip() and not line.strip().startswith("#")]
+        if not lines:
+            return []
+
+        records = list(csv.reader(line for _, line in lines))
+        header = [cell.strip().lower() for cell in records[0]]
+        columns = {}
+        for key, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in header:
+                    columns[key] = header.index(alias)
+                    break
+        if columns:
+            lines, records = lines[1:], records[1:]
+
+        def cell(record, key, position):
+            index = columns.get(key, position if not columns else None)
+            if index is None or index >= len(record):
+                return ""
+            return record[index].strip()
+
+        rows = []
+        for (number, _), record in zip(lines, records):
+            try:
+                if columns and "location" in columns:
+                    location = cell(record, "location", None)
+                else:
+                    lat, lng = cell(record, "lat", 0), cell(record, "lng", 1)
+                    location = f"{float(lat)},{float(lng)}" if lat and lng else ""
+                pano_id = cell(record, "pano_id", 5)
+                if not location and not pano_id:
+                    raise ValueError("a location (lat,lng) or a pano_id is required")
+
+                heading = cell(record, "heading", 2)
+                pitch = cell(record, "pitch", 3)
+                fov = cell(record, "fov", 4)
+                rows.append(BatchRow(
+                    line=number,
+                    location=location,
+                    heading=float(heading) if heading else default_heading,
+                    pitch=max(-90.0, min(90.0, float(pitch))) if pitch else default_pitch,
+                    fov=max(10, min(120, int(float(fov)))) if fov else default_fov,
+                    pano_id=pano_id,
+                    error=None,
+                ))
+            except ValueError as e:
+                rows.append(BatchRow(number, "", 0.0, 0.0, 0, "", f"Could not parse line {number}: {e}"))
+        return rows
+
+    def load_row(self, row, batch, index, width, height):
+        """
+        Fetches one row and writes it into batch[index].
+
+        Returns:
+            A dictionary with the row's metadata; "ok" is False for failed rows.
+        """
+        info = {"line": row.line, "location": row.location, "heading": row.heading,
+                "pitch": row.pitch, "fov": row.fov, "pano_id": row.pano_id}
+        if row.error:
+            return dict(info, ok=False, error=row.error)
+
+        try:
+            panorama = preflight_panorama(API_KEY_FROM_ENV, row.location, row.pano_id)
+            if panorama.no_coverage:
+                return dict(info, ok=False, error=f"No Street View imagery available ({panorama.status})")
+            if panorama.ok:
+                info.update(pano_id=panorama.pano_id, date=panorama.date)
+
+            result = fetch_streetview_array(
+                api_key=API_KEY_FROM_ENV,
+                location=row.location,
+                pano_id=info["pano_id"],
+                heading=row.heading,
+                pitch=row.pitch,
+                fov=row.fov,
+                width=width,
+                height=height,
+            )
+            if not result.ok:
+                return dict(info, ok=False, error=result.metadata)
+
+            image_to_tensor(result.image, out=batch[index])
+            return dict(info, ok=True, url=result.metadata)
+        except (QuotaExceededError, ArchiveMissError):
+            raise
+        except Exception as e:
+            return dict(info, ok=False, error=f"Error fetching row: {e}")
+
+    @instrument_node("StreetViewBatchLoader")
+    async def load_batch(self, rows, aspect_ratio, default_heading, default_pitch, default_fov, max_concurrency=8, skip_failed=False):
+        if not API_KEY_FROM_ENV:
+            raise ValueError("Google Street View API key not found in .env file. Please ensure GOOGLE_STREET_VIEW_API_KEY is set in ComfyUI_StreetView-Loader/.env")
+
+        # Determine width and height based on the selected aspect ratio
+        width, height = aspect_ratio_size(aspect_ratio)
+
+        parsed_rows = self.parse_rows(rows, default_heading, default_pitch, default_fov)
+        if not parsed_rows:
+            raise ValueError("StreetView Batch: No rows to load. Enter one lat,lng[,heading,pitch,fov,pano_id] per line.")
+
+        print(f"StreetView Batch: Loading {len(parsed_rows)} rows at {width}x{height} with up to {max_concurrency} in flight.")
+
+        # Every row is fetched, decoded and converted straight into its slot of one batch;
+        # failed rows stay black. Rows run concurrently, so conversions overlap network I/O.
+        batch = allocate_image_batch(len(parsed_rows), height, width)
+
+        def load_row(item):
+            index, row = item
+            return self.load_row(row, batch, index, width, height)
+
+        results = await map_concurrent_async(load_row, enumerate(parsed_rows), max_concurrency)
+
+        failed = [result for result in results if not result["ok"]]
+        for index, result in enumerate(results):
+            if not result["ok"]:
+                batch[index].zero_()
+        if skip_failed and failed:
+            kept = [index for index, result in enumerate(results) if result["ok"]]
+            if not kept:
+                raise ValueError(f"StreetView Batch: All {len(results)} rows failed. First error: {failed[0]['error']}")
+            batch = batch[kept]
+
+        summary = f"Batch: {len(results) - len(failed)}/{len(results)} rows loaded at {width}x{height}, {batch.shape[0]} images in the batch."
+        metadata = summary + "\n" + "\n".join(json.dumps(result) for result in results)
+        failed_rows = "\n".join(f"line {result['line']}: {result['error']}" for result in failed)
+
+        return (batch, metadata, failed_rows)
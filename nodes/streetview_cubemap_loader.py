@@ -1,12 +1,20 @@
 # file: ComfyUI_StreetView-Loader/nodes/streetview_cubemap_loader.py
 
+import asyncio
 import torch
 import numpy as np
 import os
 from dotenv import load_dotenv
-from PIL import Image
+import cv2
 
-from ..utils.connect_api_utils import fetch_streetview_image
+from ..utils.connect_api_utils import fetch_streetview_array, normalize_request
+from ..utils.concurrency import map_concurrent_async
+from ..utils.rate_limiter import QuotaExceededError
+from ..utils.archive import ArchiveMissError
+from ..utils.image_utils import image_to_tensor
+from ..utils.pano_metadata import preflight_panorama
+from ..utils.metrics import instrument_node
+from ..utils.fingerprint import plan_fingerprint
 
 # --- Load API Key ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -15,6 +23,32 @@ dotenv_path = os.path.join(parent_dir, '.env')
 load_dotenv(dotenv_path=dotenv_path)
 API_KEY_FROM_ENV = os.getenv("GOOGLE_STREET_VIEW_API_KEY")
 
+# The 6 face orientations for the cubemap as (heading, pitch)
+# For perfect cubemap geometry, we use 90° FOV for all faces
+# Note: For up/down faces, extreme pitch values (+90/-90) may not work with Street View API,
+# so fetch_face retries them at near-vertical values while maintaining 90° FOV
+FACE_ORIENTATIONS = {
+    "front": (0, 0),       # Facing forward
+    "back": (180, 0),      # Facing backward
+    "left": (270, 0),      # Facing left
+    "right": (90, 0),      # Facing right
+    "up": (0, 90),         # Looking up (with 90° FOV - may fail but geometrically correct)
+    "down": (0, -90)       # Looking down (with 90° FOV - may fail but geometrically correct)
+}
+
+# Merged output layouts: (columns, rows, {face_name: (column, row)})
+CUBEMAP_LAYOUTS = {
+    # Cross: up in center top, left-front-right-back in the middle row, down in center bottom
+    "merged_cross": (4, 3, {
+        "up": (1, 0),
+        "left": (0, 1), "front": (1, 1), "right": (2, 1), "back": (3, 1),
+        "down": (1, 2),
+    }),
+    # Strips, order: right, left, up, down, front, back (common for some 3D engines)
+    "merged_hstrip": (6, 1, {"right": (0, 0), "left": (1, 0), "up": (2, 0), "down": (3, 0), "front": (4, 0), "back": (5, 0)}),
+    "merged_vstrip": (1, 6, {"right": (0, 0), "left": (0, 1), "up": (0, 2), "down": (0, 3), "front": (0, 4), "back": (0, 5)}),
+}
+
 
 class StreetViewCubemapLoader:
     """
@@ -41,6 +75,7 @@ class StreetViewCubemapLoader:
             # NEW: Optional input for Historical Date ID (Panorama ID)
             "optional": {
                 "historical_date_id": ("STRING", {"default": "", "multiline": False, "tooltip": "Enter a panorama ID to load a historical cubemap from a specific date"}),
+                "max_concurrency": ("INT", {"default": 6, "min": 1, "max": 16, "step": 1, "tooltip": "Number of faces fetched at the same time"}),
             }
         }
 
@@ -49,103 +84,118 @@ class StreetViewCubemapLoader:
     FUNCTION = "load_cubemap"
     CATEGORY = "Ru4ls/StreetView"
 
-    def pil_to_tensor(self, image: Image.Image):
-        image_np = np.array(image).astype(np.float32) / 255.0
-        return torch.from_numpy(image_np)[None,]
+    @classmethod
+    def IS_CHANGED(s, location, face_resolution, output_mode, historical_date_id="", **kwargs):
+        width, height = (int(v) for v in face_resolution.split("x"))
+        plan = {
+            "faces": [normalize_request(location, heading, pitch, 90, width, height, historical_date_id) for heading, pitch in FACE_ORIENTATIONS.values()],
+            "output_mode": output_mode,
+        }
+        return plan_fingerprint(plan, pinned=bool(historical_date_id and historical_date_id.strip()))
 
-    def is_valid_image(self, image: Image.Image):
+    def assemble_cubemap(self, face_images, output_mode, width, height):
         """
-        Check if the image is valid (not completely black or filled with a single color).
-        This helps detect when the Street View API returns placeholder images.
-        """
-        # Convert to numpy array
-        img_array = np.array(image)
-
-        # Check if it's mostly black (typical for failed API requests)
-        # If more than 90% of pixels are very dark, consider it invalid
-        dark_pixels = np.sum(img_array < 30)  # pixels with values under 30/255
-        total_pixels = img_array.size
+        Writes the faces straight into one preallocated output tensor.
 
-        # If more than 90% of pixels are very dark, it's likely a failed request
-        if dark_pixels / total_pixels > 0.9:
-            return False
+        Every face is brought to the requested width x height first: the API
+        returns at most 640 px, while gray fallbacks for failed faces are built
+        at the requested size, so one cubemap can mix both.
 
-        # Also check if the image is filled with a uniform color (another failure indicator)
-        # Calculate the standard deviation of pixel values; low std indicates uniform color
-        if np.std(img_array) < 5:  # If standard deviation is very low, it's likely a uniform color
-            return False
+        For the merged layouts the faces are converted into their slots of the
+        cross/strip canvas, and the per-face outputs are views of those slots, so
+        every pixel is converted once and no second canvas is allocated. For
+        "individual_faces" the faces share one (6, H, W, 3) batch instead.
 
-        return True
-
-    def create_merged_cubemap(self, face_images, output_mode):
+        Returns:
+            A tuple (merged_tensor or None, {face_name: (1, H, W, 3) tensor view}).
         """
-        Create a merged cubemap texture based on the selected output mode.
+        face_images = {
+            face_name: image_np if image_np.shape[:2] == (height, width)
+            else cv2.resize(image_np, (width, height), interpolation=cv2.INTER_LANCZOS4)
+            for face_name, image_np in face_images.items()
+        }
+        layout = CUBEMAP_LAYOUTS.get(output_mode)
+
+        if layout is None:
+            batch = torch.empty((len(face_images), height, width, 3), dtype=torch.float32)
+            face_tensors = {}
+            for index, (face_name, image_np) in enumerate(face_images.items()):
+                image_to_tensor(image_np, out=batch[index])
+                face_tensors[face_name] = batch[index:index + 1]
+            return None, face_tensors
+
+        columns, rows, slots = layout
+        # Only the cross layout has empty cells; the strips are completely covered by faces
+        allocate = torch.zeros if output_mode == "merged_cross" else torch.empty
+        merged_tensor = allocate((1, rows * height, columns * width, 3), dtype=torch.float32)
+
+        face_tensors = {}
+        for face_name, (column, row) in slots.items():
+            face_view = merged_tensor[:, row * height:(row + 1) * height, column * width:(column + 1) * width]
+            image_to_tensor(face_images[face_name], out=face_view[0])
+            face_tensors[face_name] = face_view
+        return merged_tensor, face_tensors
+
+    def fetch_face(self, face_name, heading, pitch, location, historical_date_id, width, height):
         """
-        if not face_images:
-            return None
-
-        # Get the dimensions of the faces
-        width = face_images["front"].width
-        height = face_images["front"].height
-
-        if output_mode == "merged_cross":
-            # Create a cross layout: up in center top, left-front-right-back in middle row, down in center bottom
-            # Cross layout: 3 columns x 4 rows, with the side faces in the middle row
-            cross_width = 4 * width
-            cross_height = 3 * height
-
-            merged_image = Image.new('RGB', (cross_width, cross_height), (0, 0, 0))
-
-            # Place faces in cross layout
-            # Up face at top center (column 1, row 0)
-            merged_image.paste(face_images["up"], (width, 0))
-
-            # Middle row: left, front, right, back
-            merged_image.paste(face_images["left"], (0, height))
-            merged_image.paste(face_images["front"], (width, height))
-            merged_image.paste(face_images["right"], (width * 2, height))
-            merged_image.paste(face_images["back"], (width * 3, height))
-
-            # Down face at bottom center (column 1, row 2)
-            merged_image.paste(face_images["down"], (width, height * 2))
-
-        elif output_mode == "merged_hstrip":
-            # Horizontal strip layout: all 6 faces in a single row
-            strip_width = 6 * width
-            strip_height = height
-
-            merged_image = Image.new('RGB', (strip_width, strip_height), (0, 0, 0))
-
-            # Order: right, left, up, down, front, back (common for some 3D engines)
-            merged_image.paste(face_images["right"], (0, 0))  # Right
-            merged_image.paste(face_images["left"], (width, 0))  # Left
-            merged_image.paste(face_images["up"], (2 * width, 0))  # Up
-            merged_image.paste(face_images["down"], (3 * width, 0))  # Down
-            merged_image.paste(face_images["front"], (4 * width, 0))  # Front
-            merged_image.paste(face_images["back"], (5 * width, 0))  # Back
-
-        elif output_mode == "merged_vstrip":
-            # Vertical strip layout: all 6 faces in a single column
-            strip_width = width
-            strip_height = 6 * height
-
-            merged_image = Image.new('RGB', (strip_width, strip_height), (0, 0, 0))
-
-            # Order: right, left, up, down, front, back
-            merged_image.paste(face_images["right"], (0, 0))  # Right
-            merged_image.paste(face_images["left"], (0, height))  # Left
-            merged_image.paste(face_images["up"], (0, 2 * height))  # Up
-            merged_image.paste(face_images["down"], (0, 3 * height))  # Down
-            merged_image.paste(face_images["front"], (0, 4 * height))  # Front
-            merged_image.paste(face_images["back"], (0, 5 * height))  # Back
+        Fetches one cubemap face (90° FOV), retrying up/down faces at a near-vertical pitch.
 
-        else:
-            # Default to individual faces if mode is invalid
-            return None
+        Returns:
+            A tuple of (uint8 RGB array, metadata_line) on success,
+            or (gray_placeholder_image, None) if the face could not be fetched.
+        """
+        print(f"  - Fetching {face_name} face at heading {heading}°, pitch {pitch}°, fov 90°...")
+        try:
+            # validate=True rejects blank placeholders (often returned at extreme angles) in the fetch layer
+            result = fetch_streetview_array(
+                api_key=API_KEY_FROM_ENV,
+                location=location,
+                pano_id=historical_date_id,  # Pass the historical date ID if provided
+                heading=heading,
+                pitch=pitch,
+                fov=90,  # Always use 90° FOV for proper cubemap geometry
+                width=width,
+                height=height,
+                validate=True
+            )
+
+            if result.ok:
+                return (result.image, f"{face_name}: {result.metadata}")
+
+            # For up/down faces, try a fallback pitch if the extreme pitch failed
+            if face_name in ["up", "down"]:
+                fallback_pitch = 85 if face_name == "up" else -85
+                print(f"  - {face_name} face failed with {pitch}° pitch, trying {fallback_pitch}°...")
+
+                fallback = fetch_streetview_array(
+                    api_key=API_KEY_FROM_ENV,
+                    location=location,
+                    pano_id=historical_date_id,  # Pass the historical date ID if provided
+                    heading=heading,
+                    pitch=fallback_pitch,
+                    fov=90,  # Always use 90° FOV for proper cubemap geometry
+                    width=width,
+                    height=height,
+                    validate=True
+                )
+
+                if fallback.ok:
+                    print(f"  - Successfully fetched {face_name} face with fallback pitch {fallback_pitch}°")
+                    return (fallback.image, f"{face_name}: (fallback) {fallback.metadata}")
+
+                print(f"  - Failed to fetch {face_name} face with fallback, using gray placeholder.")
+            else:
+                # For non-up/down faces, use fallback immediately
+                print(f"  - Failed to fetch {face_name} face, using fallback image.")
+        except (QuotaExceededError, ArchiveMissError):
+            raise
+        except Exception as e:
+            print(f"  - Error fetching {face_name} face: {str(e)}")
 
-        return merged_image
+        return (np.full((height, width, 3), 64, dtype=np.uint8), None)  # Gray fallback
 
-    def load_cubemap(self, location, face_resolution, output_mode, historical_date_id=""):
+    @instrument_node("StreetViewCubemapLoader")
+    async def load_cubemap(self, location, face_resolution, output_mode, historical_date_id="", max_concurrency=6):
         if not API_KEY_FROM_ENV:
             raise ValueError("Google Street View API key not found in .env file.")
 
@@ -161,104 +211,50 @@ class StreetViewCubemapLoader:
         else:
             width, height = 512, 512
 
-        # Define the 6 face orientations for the cubemap
-        # For perfect cubemap geometry, we use 90° FOV for all faces
-        # Note: For up/down faces, extreme pitch values (+90/-90) may not work with Street View API,
-        # so we use near-vertical values that are more likely to succeed while maintaining 90° FOV
-        face_orientations = {
-            "front": (0, 0),       # Facing forward
-            "back": (180, 0),      # Facing backward
-            "left": (270, 0),      # Facing left
-            "right": (90, 0),      # Facing right
-            "up": (0, 90),         # Looking up (with 90° FOV - may fail but geometrically correct)
-            "down": (0, -90)       # Looking down (with 90° FOV - may fail but geometrically correct)
-        }
+        # The 6 face orientations of the cubemap (see FACE_ORIENTATIONS)
+        face_orientations = FACE_ORIENTATIONS
 
-        face_images = {}
-        face_metadata = []
-        successful_fetches = 0
+        # Free metadata preflight: skip billed requests where there is no imagery and pin every request to one panorama
+        panorama = await asyncio.to_thread(preflight_panorama, API_KEY_FROM_ENV, location, historical_date_id)
+        if panorama.no_coverage:
+            print(f"StreetView Cubemap: No imagery at {location} ({panorama.status}), skipping all face requests.")
+            empty_tensor = torch.zeros((1, height, width, 3), dtype=torch.float32)
+            return (empty_tensor,) * 7 + (f"No Street View imagery available for this location ({panorama.status}).",)
+        pano_id = panorama.pano_id if panorama.ok else historical_date_id
 
         print(f"StreetView Cubemap: Fetching 6 images for cubemap faces at resolution {width}x{height}.")
 
-        # Fetch each face of the cubemap using 90° FOV for all faces (optimal for cubemap geometry)
-        for face_name, (heading, pitch) in face_orientations.items():
-            print(f"  - Fetching {face_name} face at heading {heading}°, pitch {pitch}°, fov 90°...")
-            try:
-                image_pil, metadata_url = fetch_streetview_image(
-                    api_key=API_KEY_FROM_ENV,
-                    location=location,
-                    pano_id=historical_date_id,  # Pass the historical date ID if provided
-                    heading=heading,
-                    pitch=pitch,
-                    fov=90,  # Always use 90° FOV for proper cubemap geometry
-                    width=width,
-                    height=height
-                )
+        def fetch_face(face_item):
+            face_name, (heading, pitch) = face_item
+            return self.fetch_face(face_name, heading, pitch, location, pano_id, width, height)
+
+        # Fetch all faces concurrently; results come back in face_orientations order
+        face_results = await map_concurrent_async(fetch_face, face_orientations.items(), max_concurrency)
 
-                # Check if the image is valid (not all black, which often indicates API failure at extreme angles)
-                if image_pil and self.is_valid_image(image_pil):
-                    face_images[face_name] = image_pil
-                    face_metadata.append(f"{face_name}: {metadata_url}")
-                    successful_fetches += 1
-                else:
-                    # For up/down faces, try a fallback pitch if the extreme pitch failed
-                    if face_name in ["up", "down"]:
-                        fallback_pitch = 85 if face_name == "up" else -85
-                        print(f"  - {face_name} face failed with {pitch}° pitch, trying {fallback_pitch}°...")
-
-                        fallback_image, fallback_metadata_url = fetch_streetview_image(
-                            api_key=API_KEY_FROM_ENV,
-                            location=location,
-                            pano_id=historical_date_id,  # Pass the historical date ID if provided
-                            heading=heading,
-                            pitch=fallback_pitch,
-                            fov=90,  # Always use 90° FOV for proper cubemap geometry
-                            width=width,
-                            height=height
-                        )
-                        
-                        if fallback_image and self.is_valid_image(fallback_image):
-                            face_images[face_name] = fallback_image
-                            face_metadata.append(f"{face_name}: (fallback) {fallback_metadata_url}")
-                            successful_fetches += 1
-                            print(f"  - Successfully fetched {face_name} face with fallback pitch {fallback_pitch}°")
-                        else:
-                            print(f"  - Failed to fetch {face_name} face with fallback, using gray placeholder.")
-                            face_images[face_name] = Image.new('RGB', (width, height), color=(64, 64, 64))  # Gray fallback
-                    else:
-                        # For non-up/down faces, use fallback immediately
-                        print(f"  - Failed to fetch {face_name} face, using fallback image.")
-                        face_images[face_name] = Image.new('RGB', (width, height), color=(64, 64, 64))  # Gray fallback
-            except Exception as e:
-                print(f"  - Error fetching {face_name} face: {str(e)}")
-                face_images[face_name] = Image.new('RGB', (width, height), color=(64, 64, 64))  # Gray fallback
+        face_images = {}
+        face_metadata = []
+        successful_fetches = 0
+        for face_name, (image_np, metadata_line) in zip(face_orientations, face_results):
+            face_images[face_name] = image_np
+            if metadata_line is not None:
+                face_metadata.append(metadata_line)
+                successful_fetches += 1
 
         if successful_fetches == 0:
             empty_tensor = torch.zeros((1, height, width, 3), dtype=torch.float32)
             return (empty_tensor,) * 6 + (empty_tensor, "Failed to fetch any cubemap faces.")
 
-        # Convert each face to tensor if we're only outputting individual faces
-        # Convert individual faces to tensors
-        front_tensor = self.pil_to_tensor(face_images["front"])
-        back_tensor = self.pil_to_tensor(face_images["back"])
-        left_tensor = self.pil_to_tensor(face_images["left"])
-        right_tensor = self.pil_to_tensor(face_images["right"])
-        up_tensor = self.pil_to_tensor(face_images["up"])
-        down_tensor = self.pil_to_tensor(face_images["down"])
-
-        # Create merged cubemap based on selected mode
-        if output_mode in ["merged_cross", "merged_hstrip", "merged_vstrip"]:
-            merged_image = self.create_merged_cubemap(face_images, output_mode)
-            merged_tensor = self.pil_to_tensor(merged_image) if merged_image else torch.zeros((1, height, width, 3), dtype=torch.float32)
-        else:  # individual_faces
+        # Each face is converted once, straight into its slot of the merged output;
+        # the face outputs are views of the same memory (CPU bound, off the event loop)
+        merged_tensor, face_tensors = await asyncio.to_thread(self.assemble_cubemap, face_images, output_mode, width, height)
+        if merged_tensor is None:  # individual_faces
             # For individual faces mode, create a blank merged tensor
             merged_tensor = torch.zeros((1, height, width, 3), dtype=torch.float32)
 
         # Prepare metadata string
-        if output_mode == "individual_faces":
-            metadata = f"Successfully created cubemap with {successful_fetches}/6 faces. Resolution: {width}x{height}, FOV: 90°, Output mode: {output_mode}\n"
-        else:
-            metadata = f"Successfully created cubemap with {successful_fetches}/6 faces. Resolution: {width}x{height}, FOV: 90°, Output mode: {output_mode}\n"
+        metadata = f"Successfully created cubemap with {successful_fetches}/6 faces. Resolution: {width}x{height}, FOV: 90°, Output mode: {output_mode}\n"
+        if panorama.ok:
+            metadata += panorama.describe() + "\n"
         metadata += "\n".join(face_metadata)
 
-        return (front_tensor, back_tensor, left_tensor, right_tensor, up_tensor, down_tensor, merged_tensor, metadata)
\ No newline at end of file
+        return (face_tensors["front"], face_tensors["back"], face_tensors["left"], face_tensors["right"], face_tensors["up"], face_tensors["down"], merged_tensor, metadata)
\ No newline at end of file
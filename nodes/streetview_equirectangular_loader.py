@@ -1,12 +1,24 @@
 # file: ComfyUI_StreetView-Loader/nodes/streetview_equirectangular_loader.py
 
+import asyncio
 import torch
 import numpy as np
 import os
 from dotenv import load_dotenv
 from PIL import Image
-
-from ..utils.connect_api_utils import fetch_streetview_image
+import cv2
+
+from ..utils.connect_api_utils import fetch_streetview_array, normalize_request
+from ..utils.concurrency import map_concurrent_async
+from ..utils.rate_limiter import QuotaExceededError
+from ..utils.archive import ArchiveMissError
+from ..utils.graph_utils import linked_output_indices
+from ..utils.projection import CUBE_FACE_NAMES, CUBE_FACE_ORIENTATIONS, remap_cube_faces, face_tile_plan
+from ..utils.warp_cache import cached_equirect_cube_tables, cached_equirect_nearest_index
+from ..utils.image_utils import allocate_image_batch, image_to_tensor, flip_columns_in_place, flip_rows_in_place, transpose_in_place
+from ..utils.pano_metadata import preflight_panorama
+from ..utils.metrics import get_metrics, instrument_node
+from ..utils.fingerprint import plan_fingerprint
 
 # --- Load API Key ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -15,11 +27,19 @@ dotenv_path = os.path.join(parent_dir, '.env')
 load_dotenv(dotenv_path=dotenv_path)
 API_KEY_FROM_ENV = os.getenv("GOOGLE_STREET_VIEW_API_KEY")
 
+# Largest per-face output side; upscale_factor is clamped so six float32 face tensors stay bounded
+MAX_FACE_OUTPUT_SIZE = 4096
+# Largest equirectangular width, also the limit of the output_width input
+MAX_EQUI_WIDTH = 8192
+
 
 class StreetViewEquirectangularLoader:
     """
     A ComfyUI node that creates an equirectangular panoramic image by fetching
     6 Street View images (front, back, left, right, top, bottom) and converting them to equirectangular format.
+
+    With tile_grid > 1 every face is captured as a tile_grid x tile_grid mosaic
+    of narrower-fov requests, for real face resolutions beyond the API's 640 px.
     """
 
     @classmethod
@@ -32,10 +52,18 @@ class StreetViewEquirectangularLoader:
                 ], {"default": "640x640"}), # Max 640 for Street View Static API
                 "upscale_factor": ("INT", {"default": 2, "min": 1, "max": 4, "step": 1}),
                 "upscale_method": (["LANCZOS", "BICUBIC", "BILINEAR", "NEAREST"], {"default": "LANCZOS"}),
-                "interpolation_mode": (["BILINEAR", "NEAREST"], {"default": "BILINEAR"}),
+                "interpolation_mode": (["BILINEAR", "NEAREST", "BICUBIC"], {"default": "BILINEAR"}),
             },
             "optional": {
                 "historical_date_id": ("STRING", {"default": "", "multiline": False, "tooltip": "Enter a panorama ID to load a historical equirectangular image from a specific date. Requires Street View Image Metadata API enabled on GCP."}),
+                "max_concurrency": ("INT", {"default": 6, "min": 1, "max": 16, "step": 1, "tooltip": "Number of faces fetched at the same time"}),
+                "output_width": ("INT", {"default": 0, "min": 0, "max": MAX_EQUI_WIDTH, "step": 2, "tooltip": "Width of the equirectangular image (height is half of it). It is sampled directly from the original faces. 0 uses 2 x face size x upscale_factor, up to 8192."}),
+                "tile_grid": ("INT", {"default": 1, "min": 1, "max": 4, "step": 1, "tooltip": "Capture every face as an N x N grid of narrower-FOV requests, for faces of N x face_resolution (e.g. 4 x 640 = 2560 px). Uses N x N times the API requests."}),
+                "memmap_faces": ("BOOLEAN", {"default": False, "tooltip": "Assemble tiled faces in a memory-mapped temporary file (STREETVIEW_MEMMAP_DIR) instead of RAM"}),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
+                "prompt": "PROMPT",
             }
         }
 
@@ -44,138 +72,221 @@ class StreetViewEquirectangularLoader:
     FUNCTION = "load_equirectangular"
     CATEGORY = "Ru4ls/StreetView"
 
-    def pil_to_tensor(self, image: Image.Image):
-        image_np = np.array(image).astype(np.float32) / 255.0
-        return torch.from_numpy(image_np)[None,]
-
-    def is_valid_image(self, image: Image.Image):
-        img_array = np.array(image)
-        if img_array.ndim == 2:
-            img_array = np.stack([img_array]*3, axis=-1)
+    @classmethod
+    def IS_CHANGED(s, location, face_resolution, upscale_factor, upscale_method, interpolation_mode, historical_date_id="", max_concurrency=6, output_width=0, tile_grid=1, memmap_faces=False, **kwargs):
+        width, height = (int(v) for v in face_resolution.split("x"))
+        plan = {
+            "faces": [normalize_request(location, heading, pitch, 90, width, height, historical_date_id) for heading, pitch in CUBE_FACE_ORIENTATIONS.values()],
+            "upscale_factor": upscale_factor,
+            "upscale_method": upscale_method,
+            "interpolation_mode": interpolation_mode,
+            "output_width": output_width,
+            "tile_grid": tile_grid,
+        }
+        return plan_fingerprint(plan, pinned=bool(historical_date_id and historical_date_id.strip()))
 
-        dark_pixels = np.sum(img_array < 30)
-        total_pixels = img_array.size
+    def cube_to_equirectangular(self, faces_dict, interpolation_mode, equi_width=None):
+        """ Samples the equirectangular image (a uint8 array) from the six oriented uint8 face arrays. """
+        cube_side = faces_dict["front"].shape[1]
+        if any(face.shape[:2] != (cube_side, cube_side) for face in faces_dict.values()):
+            raise ValueError("All cube map faces must be square and of the same dimensions.")
 
-        if dark_pixels / total_pixels > 0.95:
-            return False
-        if np.std(img_array) < 5:
-            return False
-        return True
+        # The output can be larger than the faces; every pixel samples the faces directly
+        equi_width = equi_width or 2 * cube_side
+        equi_height = equi_width // 2
+
+        # The projection geometry is computed once per size and cached; each conversion only samples pixels
+        faces_np = [np.ascontiguousarray(faces_dict[name]) for name in CUBE_FACE_NAMES]
+
+        if interpolation_mode == "NEAREST":
+            # The nearest-sample index is only built (and cached) for this mode
+            nearest_index = cached_equirect_nearest_index(cube_side, equi_width, equi_height)
+            with get_metrics().timer("reproject"):
+                return np.stack(faces_np).reshape(-1, 3)[nearest_index]
+
+        tables = cached_equirect_cube_tables(cube_side, equi_width, equi_height)
+        with get_metrics().timer("reproject"):
+            # Bilinear/bicubic sampling with cv2.remap. Each face is sampled on its own with
+            # edge clamping, so filters never blend in pixels from an unrelated face across a seam.
+            equi_img_np = remap_cube_faces(faces_np, tables.face_index, tables.map_x, tables.map_y, interpolation_mode, face_pixels=tables.face_pixels)
+
+        return equi_img_np
+
+    def upscale_face(self, image_np, upscale_factor, upscale_method):
+        """ Upscales a face for the per-face outputs using the selected PIL resampling algorithm. """
+        if upscale_factor <= 1:
+            return image_np
+        image_pil = Image.fromarray(np.ascontiguousarray(image_np))
+        # Map upscale method to PIL resampling algorithm
+        upscale_map = {
+            "LANCZOS": Image.LANCZOS,
+            "BICUBIC": Image.BICUBIC,
+            "BILINEAR": Image.BILINEAR,
+            "NEAREST": Image.NEAREST
+        }
+        resample_method = upscale_map.get(upscale_method, Image.LANCZOS)
+        return image_pil.resize((image_pil.width * upscale_factor, image_pil.height * upscale_factor), resample_method)
+
+    def orient_face(self, face_name, image_np):
+        """
+        Applies the orientation fix-ups for the Street View API face layouts.
+        Returns a view of `image_np` (no copy).
+        """
+        # --- CRUCIAL ROTATIONS AND FLIPS for Street View API specific orientations ---
+        if face_name in ("left", "front"):
+            return image_np[:, ::-1]    # flip left-right
+        if face_name in ("right", "back"):
+            return image_np[::-1]       # flip top-bottom
+        # top/bottom: flip left-right, then rotate 90° clockwise (PIL ROTATE_270), which is the anti-transpose
+        return image_np[::-1, ::-1].transpose(1, 0, 2)
+
+    def orient_face_in_place(self, face_name, image_np):
+        """
+        Same fix-ups as orient_face, applied in place on a square face with
+        small temporary buffers (for the large, possibly memory-mapped tiled faces).
+        """
+        if face_name in ("left", "front"):
+            return flip_columns_in_place(image_np)
+        if face_name in ("right", "back"):
+            return flip_rows_in_place(image_np)
+        # Anti-transpose: transpose, then rotate 180° (flip both axes)
+        transpose_in_place(image_np)
+        flip_rows_in_place(image_np)
+        return flip_columns_in_place(image_np)
+
+    def fetch_face(self, face_name, heading, pitch, location, historical_date_id, width, height):
+        """
+        Fetches one cube face and applies the orientation fix-ups.
+
+        Returns:
+            A tuple of (uint8 array, metadata_line) on success,
+            or (gray_placeholder_image, None) if the face could not be fetched.
+        """
+        print(f"  - Fetching {face_name} face at heading {heading}°, pitch {pitch}°, fov 90°...")
+
+        fetch_params = {
+            "api_key": API_KEY_FROM_ENV,
+            "heading": heading,
+            "pitch": pitch,
+            "fov": 90,
+            "width": width,
+            "height": height,
+            # Blank placeholder faces are rejected in the fetch layer, before any flip, upscale or tensor work
+            "validate": True,
+            # A pano ID overrides the location (the location is still a required argument)
+            "location": location,
+            "pano_id": historical_date_id,
+        }
 
-    def cube_to_equirectangular(self, faces_pil_dict, interpolation_mode):
-        cube_side = faces_pil_dict["front"].width
-        if any(face.width != cube_side or face.height != cube_side for face in faces_pil_dict.values()):
-            raise ValueError("All cube map faces must be square and of the same dimensions.")
+        try:
+            result = fetch_streetview_array(**fetch_params)
+
+            if result.ok:
+                return (np.ascontiguousarray(self.orient_face(face_name, result.image)), f"{face_name}: {result.metadata}")
+
+            print(f"  - Failed to fetch {face_name} face or received invalid image, using gray placeholder.")
+
+        except (QuotaExceededError, ArchiveMissError):
+            raise
+        except Exception as e:
+            print(f"  - Error fetching {face_name} face: {str(e)}")
+
+        return (np.full((height, width, 3), 64, dtype=np.uint8), None)
+
+    def fetch_tile(self, face, face_name, tile, location, historical_date_id, tile_size):
+        """
+        Fetches one tile of a tiled face and reprojects it straight into its cell of
+        `face` (the raw, not yet oriented face buffer). Failed tiles are filled gray.
+
+        Returns:
+            The metadata line on success, or None if the tile could not be fetched.
+        """
+        cell = face[tile.row * tile_size:(tile.row + 1) * tile_size, tile.col * tile_size:(tile.col + 1) * tile_size]
+        fetch_params = {
+            "api_key": API_KEY_FROM_ENV,
+            "heading": tile.heading,
+            "pitch": tile.pitch,
+            "fov": tile.fov,
+            "width": tile_size,
+            "height": tile_size,
+            "validate": True,
+            "location": location,
+            "pano_id": historical_date_id,
+        }
 
-        equi_width = 2 * cube_side
-        equi_height = cube_side
-
-        faces_np_dict = {name: np.array(img) for name, img in faces_pil_dict.items()}
-        equi_img_np = np.zeros((equi_height, equi_width, 3), dtype=np.uint8)
-
-        # Vectorized computation for better performance
-        y_coords, x_coords = np.mgrid[0:equi_height, 0:equi_width]
-
-        # Convert equirectangular coordinates to spherical coordinates
-        lon = (x_coords / equi_width - 0.5) * 2 * np.pi
-        lat = (0.5 - y_coords / equi_height) * np.pi
-
-        # Convert spherical to Cartesian coordinates
-        x_cart = np.cos(lat) * np.sin(lon)
-        y_cart = np.sin(lat)
-        z_cart = np.cos(lat) * np.cos(lon)
-
-        abs_X = np.abs(x_cart)
-        abs_Y = np.abs(y_cart)
-        abs_Z = np.abs(z_cart)
-
-        # Determine which face each pixel maps to
-        face_mask_x = (abs_X >= abs_Y) & (abs_X >= abs_Z)  # X-axis faces (Right/Left)
-        face_mask_y = (abs_Y >= abs_X) & (abs_Y >= abs_Z)  # Y-axis faces (Top/Bottom)
-        face_mask_z = (abs_Z >= abs_X) & (abs_Z >= abs_Y)  # Z-axis faces (Front/Back)
-
-        # Initialize face assignment matrix
-        face_assignment = np.full((equi_height, equi_width), "", dtype=object)
-
-        # Assign faces based on direction
-        # X-axis faces (Right/Left)
-        right_mask = face_mask_x & (x_cart > 0)
-        left_mask = face_mask_x & (x_cart <= 0)
-        face_assignment[right_mask] = "back"  # Right Face (+X_cart) -> should map to Back
-        face_assignment[left_mask] = "front"  # Left Face (-X_cart) -> should map to Front
-
-        # Y-axis faces (Top/Bottom)
-        top_mask = face_mask_y & (y_cart > 0)
-        bottom_mask = face_mask_y & (y_cart <= 0)
-        face_assignment[top_mask] = "top"
-        face_assignment[bottom_mask] = "bottom"
-
-        # Z-axis faces (Front/Back)
-        front_mask = face_mask_z & (z_cart > 0)
-        back_mask = face_mask_z & (z_cart <= 0)
-        face_assignment[front_mask] = "right"  # Front Face (+Z_cart) -> should map to Right
-        face_assignment[back_mask] = "left"   # Back Face (-Z_cart) -> should map to Left
-
-        # Calculate UV coordinates for each face type
-        u_coords = np.zeros((equi_height, equi_width))
-        v_coords = np.zeros((equi_height, equi_width))
-
-        with np.errstate(divide='ignore', invalid='ignore'):
-            # X-axis faces (Right/Left)
-            u_coords[right_mask] = -z_cart[right_mask] / x_cart[right_mask]
-            v_coords[right_mask] = y_cart[right_mask] / x_cart[right_mask]
-            u_coords[left_mask] = z_cart[left_mask] / x_cart[left_mask]
-            v_coords[left_mask] = y_cart[left_mask] / x_cart[left_mask]
-
-            # Y-axis faces (Top/Bottom)
-            u_coords[top_mask] = x_cart[top_mask] / y_cart[top_mask]
-            v_coords[top_mask] = -z_cart[top_mask] / y_cart[top_mask]
-            u_coords[bottom_mask] = x_cart[bottom_mask] / y_cart[bottom_mask]
-            v_coords[bottom_mask] = z_cart[bottom_mask] / y_cart[bottom_mask]
-
-            # Z-axis faces (Front/Back)
-            u_coords[front_mask] = x_cart[front_mask] / z_cart[front_mask]
-            v_coords[front_mask] = y_cart[front_mask] / z_cart[front_mask]
-            u_coords[back_mask] = -x_cart[back_mask] / z_cart[back_mask]
-            v_coords[back_mask] = y_cart[back_mask] / z_cart[back_mask]
-
-        # Clamp UV coordinates to valid range [-1, 1] and convert to pixel coordinates
-        u_coords = np.clip(u_coords, -1, 1)
-        v_coords = np.clip(v_coords, -1, 1)
-        px_u = np.clip((u_coords * 0.5 + 0.5) * cube_side, 0, cube_side - 1)
-        px_v = np.clip((v_coords * 0.5 + 0.5) * cube_side, 0, cube_side - 1)
-
-        # Process each face separately
-        for face_name in faces_np_dict.keys():
-            face_mask = face_assignment == face_name
-            if not np.any(face_mask):
-                continue
-
-            # Get the face's pixel data
-            face_data = faces_np_dict[face_name]
-
-            # Get the corresponding u,v coordinates for this face
-            face_u = px_u[face_mask].astype(int)
-            face_v = px_v[face_mask].astype(int)
-
-            # Sample pixels from the face
-            sampled_pixels = face_data[face_v, face_u]
-
-            # Assign to output
-            equi_img_np[face_mask] = sampled_pixels
-
-        return Image.fromarray(equi_img_np)
-
-    def load_equirectangular(self, location, face_resolution, upscale_factor, upscale_method, interpolation_mode, historical_date_id=""):
+        try:
+            result = fetch_streetview_array(**fetch_params)
+            if result.ok:
+                # Only one tile is held at a time; the face buffer may be memory-mapped
+                with get_metrics().timer("reproject"):
+                    cell[...] = cv2.remap(result.image, tile.map1, tile.map2, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+                return f"{face_name} tile {tile.row},{tile.col}: {result.metadata}"
+            print(f"  - Failed to fetch {face_name} tile {tile.row},{tile.col}, using gray placeholder.")
+        except (QuotaExceededError, ArchiveMissError):
+            raise
+        except Exception as e:
+            print(f"  - Error fetching {face_name} tile {tile.row},{tile.col}: {str(e)}")
+
+        cell[...] = 64
+        return None
+
+    async def fetch_tiled_faces(self, face_orientations, location, historical_date_id, tile_size, tile_grid, max_concurrency, memmap_faces):
+        """
+        Captures all six faces as tile_grid x tile_grid mosaics into one preallocated
+        (optionally memory-mapped) (6, S, S, 3) uint8 buffer, S = tile_grid x tile_size.
+        All tiles of all faces are fetched concurrently and streamed into the buffer.
+
+        Returns:
+            A tuple of ({face_name: oriented face array}, metadata_lines, successful_faces).
+        """
+        face_size = tile_grid * tile_size
+        faces = allocate_image_batch(len(face_orientations), face_size, face_size, "uint8", memmap_faces).numpy()
+
+        plans = await asyncio.to_thread(
+            lambda: [face_tile_plan(heading, pitch, tile_grid, tile_size) for heading, pitch in face_orientations.values()]
+        )
+        jobs = [
+            (index, face_name, tile)
+            for index, (face_name, plan) in enumerate(zip(face_orientations, plans))
+            for tile in plan
+        ]
+
+        def fetch_tile(job):
+            index, face_name, tile = job
+            return self.fetch_tile(faces[index], face_name, tile, location, historical_date_id, tile_size)
+
+        tile_results = await map_concurrent_async(fetch_tile, jobs, max_concurrency)
+
+        def orient_faces():
+            oriented = {}
+            for index, face_name in enumerate(face_orientations):
+                # In place with block-sized temporaries, so no second copy of a face is allocated
+                oriented[face_name] = self.orient_face_in_place(face_name, faces[index])
+            return oriented
+
+        faces_dict = await asyncio.to_thread(orient_faces)
+
+        metadata_lines = [line for line in tile_results if line is not None]
+        successful_faces = len({job[1] for job, line in zip(jobs, tile_results) if line is not None})
+        print(f"StreetView Equirectangular: Fetched {len(metadata_lines)}/{len(jobs)} tiles.")
+        return faces_dict, metadata_lines, successful_faces
+
+    @instrument_node("StreetViewEquirectangularLoader")
+    async def load_equirectangular(self, location, face_resolution, upscale_factor, upscale_method, interpolation_mode, historical_date_id="", max_concurrency=6, output_width=0, tile_grid=1, memmap_faces=False, unique_id=None, prompt=None):
         if not API_KEY_FROM_ENV:
             raise ValueError("Google Street View API key not found in .env file.")
 
         res_parts = face_resolution.split('x')
-        width, height = int(res_parts[0]), int(res_parts[1])
+        tile_size = int(res_parts[0])
+        # With tiling, every face is a mosaic of tile_grid x tile_grid requests of face_resolution
+        width, height = tile_size * tile_grid, int(res_parts[1]) * tile_grid
 
-        # Calculate the upscaling dimensions
-        upscaled_width = width * upscale_factor
-        upscaled_height = height * upscale_factor
+        # Calculate the upscaling dimensions; large tiled faces are not upscaled beyond MAX_FACE_OUTPUT_SIZE
+        face_upscale = max(1, min(upscale_factor, MAX_FACE_OUTPUT_SIZE // max(width, height)))
+        if face_upscale < upscale_factor:
+            print(f"StreetView Equirectangular: Face outputs limited to {MAX_FACE_OUTPUT_SIZE}px, upscale factor {upscale_factor} reduced to {face_upscale}.")
+        upscaled_width = width * face_upscale
+        upscaled_height = height * face_upscale
 
         face_orientations = {
             "front": (0, 0),       # Heading 0, Pitch 0
@@ -186,86 +297,75 @@ class StreetViewEquirectangularLoader:
             "bottom": (0, -90)     # Heading 0, Pitch -90
         }
 
-        face_images_tensors = {}
-        faces_pil_for_conversion = {}
-        face_metadata = []
-        successful_fetches = 0
+        # The equirectangular image is sampled straight from the original faces at the target width
+        equi_width = output_width if output_width > 0 else min(2 * width * upscale_factor, MAX_EQUI_WIDTH)
 
-        print(f"StreetView Equirectangular: Fetching 6 images for cube faces at resolution {width}x{height}, then upscaling by factor {upscale_factor} to {upscaled_width}x{upscaled_height}.")
+        # Per-face outputs (slots 1-6) are only converted (and upscaled) when something consumes them
+        linked_outputs = linked_output_indices(prompt, unique_id)
+        faces_connected = linked_outputs is None or any(index in linked_outputs for index in range(1, 7))
 
-        for face_name, (heading, pitch) in face_orientations.items():
-            print(f"  - Fetching {face_name} face at heading {heading}°, pitch {pitch}°, fov 90°...")
-
-            fetch_params = {
-                "api_key": API_KEY_FROM_ENV,
-                "heading": heading,
-                "pitch": pitch,
-                "fov": 90,
-                "width": width,
-                "height": height
-            }
-            if historical_date_id:
-                fetch_params["pano_id"] = historical_date_id
-            else:
-                fetch_params["location"] = location
-
-            try:
-                image_pil, metadata_url = fetch_streetview_image(**fetch_params)
-
-                if image_pil:
-                    # --- CRUCIAL ROTATIONS AND FLIPS for Street View API specific orientations ---
-                    if face_name == "left":
-                        image_pil = image_pil.transpose(Image.FLIP_LEFT_RIGHT)
-                    elif face_name == "front":
-                        image_pil = image_pil.transpose(Image.FLIP_LEFT_RIGHT)
-                    elif face_name == "right":
-                        image_pil = image_pil.transpose(Image.FLIP_TOP_BOTTOM)
-                    elif face_name == "back":
-                        image_pil = image_pil.transpose(Image.FLIP_TOP_BOTTOM)
-                    elif face_name == "top":
-                        image_pil = image_pil.transpose(Image.FLIP_LEFT_RIGHT).transpose(Image.ROTATE_270)
-                    elif face_name == "bottom":
-                        image_pil = image_pil.transpose(Image.FLIP_LEFT_RIGHT).transpose(Image.ROTATE_270)
-
-                    # Upscale the image after applying rotations
-                    if upscale_factor > 1:
-                        # Map upscale method to PIL resampling algorithm
-                        upscale_map = {
-                            "LANCZOS": Image.LANCZOS,
-                            "BICUBIC": Image.BICUBIC,
-                            "BILINEAR": Image.BILINEAR,
-                            "NEAREST": Image.NEAREST
-                        }
-                        resample_method = upscale_map.get(upscale_method, Image.LANCZOS)
-                        image_pil = image_pil.resize((upscaled_width, upscaled_height), resample_method)
-
-                if image_pil and self.is_valid_image(image_pil):
-                    face_images_tensors[face_name] = self.pil_to_tensor(image_pil)
-                    faces_pil_for_conversion[face_name] = image_pil
-                    face_metadata.append(f"{face_name}: {metadata_url}")
+        # Free metadata preflight: skip billed requests where there is no imagery and pin every request to one panorama
+        panorama = await asyncio.to_thread(preflight_panorama, API_KEY_FROM_ENV, location, historical_date_id)
+        if panorama.no_coverage:
+            print(f"StreetView Equirectangular: No imagery at {location} ({panorama.status}), skipping all face requests.")
+            empty_tensor = torch.zeros((1, upscaled_height, upscaled_width, 3), dtype=torch.float32)
+            return (empty_tensor,) * 7 + (f"No Street View imagery available for this location ({panorama.status}).",)
+        pano_id = panorama.pano_id if panorama.ok else historical_date_id
+
+        if tile_grid > 1:
+            print(f"StreetView Equirectangular: Fetching 6 cube faces as {tile_grid}x{tile_grid} tiles of {face_resolution}, face resolution {width}x{height}, equirectangular width {equi_width}.")
+            faces_for_conversion, face_metadata, successful_fetches = await self.fetch_tiled_faces(
+                face_orientations, location, pano_id, tile_size, tile_grid, max_concurrency, memmap_faces
+            )
+        else:
+            print(f"StreetView Equirectangular: Fetching 6 images for cube faces at resolution {width}x{height}, equirectangular width {equi_width}.")
+
+            def fetch_face(face_item):
+                face_name, (heading, pitch) = face_item
+                return self.fetch_face(face_name, heading, pitch, location, pano_id, width, height)
+
+            # Fetch (and flip) all faces concurrently; results come back in face_orientations order
+            face_results = await map_concurrent_async(fetch_face, face_orientations.items(), max_concurrency)
+
+            faces_for_conversion = {}
+            face_metadata = []
+            successful_fetches = 0
+
+            for face_name, (image_np, metadata_line) in zip(face_orientations, face_results):
+                faces_for_conversion[face_name] = image_np
+                if metadata_line is not None:
+                    face_metadata.append(metadata_line)
                     successful_fetches += 1
-                else:
-                    print(f"  - Failed to fetch {face_name} face or received invalid image, using gray placeholder.")
-                    gray_pil = Image.new('RGB', (upscaled_width, upscaled_height), color=(64, 64, 64))
-                    face_images_tensors[face_name] = self.pil_to_tensor(gray_pil)
-                    faces_pil_for_conversion[face_name] = gray_pil
-
-            except Exception as e:
-                print(f"  - Error fetching {face_name} face: {str(e)}")
-                gray_pil = Image.new('RGB', (upscaled_width, upscaled_height), color=(64, 64, 64))
-                face_images_tensors[face_name] = self.pil_to_tensor(gray_pil)
-                faces_pil_for_conversion[face_name] = gray_pil
 
         if successful_fetches == 0:
             print("StreetView Equirectangular: Failed to fetch any valid cube faces.")
             empty_tensor = torch.zeros((1, upscaled_height, upscaled_width, 3), dtype=torch.float32)
             return (empty_tensor,) * 7 + ("Failed to fetch any cube faces.",)
 
-        equirectangular_image_pil = self.cube_to_equirectangular(faces_pil_for_conversion, interpolation_mode)
+        # The projection is CPU bound; run it off the event loop
+        equirectangular_image_np = await asyncio.to_thread(self.cube_to_equirectangular, faces_for_conversion, interpolation_mode, equi_width)
+        equi_out_height, equi_out_width = equirectangular_image_np.shape[:2]
 
-        equirectangular_tensor = self.pil_to_tensor(equirectangular_image_pil)
+        equirectangular_tensor = image_to_tensor(equirectangular_image_np)
+        del equirectangular_image_np
 
-        metadata = f"Successfully created equirectangular panorama. Fetched {successful_fetches}/6 faces. Cube face resolution: {width}x{height}, Upscaled to: {upscaled_width}x{upscaled_height}, Equirectangular resolution: {equirectangular_image_pil.width}x{equirectangular_image_pil.height}, FOV: 90°, Upscale factor: {upscale_factor}, Upscale method: {upscale_method}\n"
+        if faces_connected:
+            face_images_tensors = {
+                face_name: image_to_tensor(self.upscale_face(image_np, face_upscale, upscale_method))
+                for face_name, image_np in faces_for_conversion.items()
+            }
+            face_summary = f"Face outputs upscaled to: {upscaled_width}x{upscaled_height}, Upscale factor: {face_upscale}, Upscale method: {upscale_method}"
+        else:
+            # No per-face output is connected: skip the upscale and share one placeholder tensor
+            placeholder = torch.zeros((1, height, width, 3), dtype=torch.float32)
+            face_images_tensors = {face_name: placeholder for face_name in faces_for_conversion}
+            face_summary = "Face outputs not connected (skipped)"
+
+        metadata = f"Successfully created equirectangular panorama. Fetched {successful_fetches}/6 faces. Cube face resolution: {width}x{height}, Equirectangular resolution: {equi_out_width}x{equi_out_height}, FOV: 90°, {face_summary}\n"
+        if tile_grid > 1:
+            metadata += f"Tiled capture: {tile_grid}x{tile_grid} tiles of {face_resolution} per face, {len(face_metadata)}/{6 * tile_grid * tile_grid} tiles fetched\n"
+        if panorama.ok:
+            metadata += panorama.describe() + "\n"
         metadata += "\n".join(face_metadata)
 
         return equirectangular_tensor, face_images_tensors["front"], face_images_tensors["back"], face_images_tensors["left"], face_images_tensors["right"], face_images_tensors["top"], face_images_tensors["bottom"], metadata
\ No newline at end of file
@@ -1,13 +1,15 @@
 # file: ComfyUI_StreetView-Loader\nodes\streetview_loader.py
 
-import torch
-import numpy as np
+import asyncio
 import os
 from dotenv import load_dotenv
-from PIL import Image
 
 # Import the refactored API call function from our utility file
-from ..utils.connect_api_utils import fetch_streetview_image
+from ..utils.connect_api_utils import fetch_streetview_array, error_result, aspect_ratio_size, normalize_request
+from ..utils.image_utils import image_to_tensor
+from ..utils.pano_metadata import preflight_panorama
+from ..utils.metrics import instrument_node
+from ..utils.fingerprint import plan_fingerprint
 
 # --- Load API Key from .env file ---
 # This logic finds the .env file in the parent directory (ComfyUI_StreetView-Loader)
@@ -62,32 +64,36 @@ class StreetViewLoader:
     FUNCTION = "load_image"
     CATEGORY = "Ru4ls/StreetView"
 
-    def load_image(self, location, heading, pitch, fov, aspect_ratio, historical_date_id=""):
+    @classmethod
+    def IS_CHANGED(s, location, heading, pitch, fov, aspect_ratio, historical_date_id="", **kwargs):
+        width, height = aspect_ratio_size(aspect_ratio)
+        plan = normalize_request(location, heading, pitch, fov, width, height, historical_date_id)
+        return plan_fingerprint(plan, pinned=bool(historical_date_id and historical_date_id.strip()))
+
+    @instrument_node("StreetViewLoader")
+    async def load_image(self, location, heading, pitch, fov, aspect_ratio, historical_date_id=""):
 
         if not API_KEY_FROM_ENV:
             raise ValueError("Google Street View API key not found in .env file. Please ensure GOOGLE_STREET_VIEW_API_KEY is set in ComfyUI_StreetView-Loader/.env")
 
         # Logic to determine width and height based on the selected aspect ratio
-        if aspect_ratio == "1:1 Square (640x640)":
-            width, height = 640, 640
-        elif aspect_ratio == "16:9 Widescreen (640x360)":
-            width, height = 640, 360
-        elif aspect_ratio == "9:16 Vertical (360x640)":
-            width, height = 360, 640
-        elif aspect_ratio == "4:3 Classic (640x480)":
-            width, height = 640, 480
-        elif aspect_ratio == "3:2 Photography (640x427)":
-            width, height = 640, 427
-        else:
-            # Fallback to a default just in case
-            width, height = 640, 640
+        width, height = aspect_ratio_size(aspect_ratio)
+
+        # Free metadata preflight: skip billed requests where there is no imagery and pin every request to one panorama
+        panorama = await asyncio.to_thread(preflight_panorama, API_KEY_FROM_ENV, location, historical_date_id)
+        if panorama.no_coverage:
+            print(f"StreetView Info: No imagery at {location} ({panorama.status}), skipping the image request.")
+            return (image_to_tensor(error_result(width, height, "").image), f"No Street View imagery available for this location ({panorama.status}).")
+        pano_id = panorama.pano_id if panorama.ok else historical_date_id
 
         # Call the refactored utility function with the calculated width and height.
         # Logic: If historical_date_id is provided, pass it. It overrides the location.
-        image_pil, metadata = fetch_streetview_image(
+        # The request runs in a worker thread so the ComfyUI executor is not blocked on network I/O.
+        result = await asyncio.to_thread(
+            fetch_streetview_array,
             api_key=API_KEY_FROM_ENV,
             location=location,
-            pano_id=historical_date_id,  # Pass the ID here
+            pano_id=pano_id,  # The resolved (or requested) panorama ID overrides the location
             heading=heading,
             pitch=pitch,
             fov=fov,
@@ -95,13 +101,11 @@ class StreetViewLoader:
             height=height
         )
 
-        # Convert the returned PIL image to the tensor format ComfyUI expects.
-        image_tensor = self.pil_to_tensor(image_pil)
+        # Convert the returned image to the tensor format ComfyUI expects.
+        image_tensor = image_to_tensor(result.image)
 
-        return (image_tensor, metadata)
+        metadata = result.metadata
+        if panorama.ok:
+            metadata = f"{metadata}\n{panorama.describe()}"
 
-    def pil_to_tensor(self, image: Image.Image):
-        """ Helper function to convert a PIL Image to a PyTorch Tensor for ComfyUI. """
-        image_np = np.array(image).astype(np.float32) / 255.0
-        # Add the batch dimension [None,] which is equivalent to unsqueeze(0)
-        return torch.from_numpy(image_np)[None,]
\ No newline at end of file
+        return (image_tensor, metadata)
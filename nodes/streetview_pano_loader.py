@@ -1,13 +1,20 @@
 # file: ComfyUI_StreetView-Loader/nodes/streetview_pano_loader.py
 
+import asyncio
 import torch
-import numpy as np
 import os
 from dotenv import load_dotenv
 from PIL import Image
 import cv2
 
-from ..utils.connect_api_utils import fetch_streetview_image
+from ..utils.connect_api_utils import fetch_streetview_array, normalize_request
+from ..utils.concurrency import map_concurrent_async
+from ..utils.image_utils import image_to_tensor
+from ..utils.projection import blend_pano_views
+from ..utils.warp_cache import cached_pano_stitch_tables
+from ..utils.pano_metadata import preflight_panorama
+from ..utils.metrics import get_metrics, instrument_node
+from ..utils.fingerprint import plan_fingerprint
 
 # --- Load API Key ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -20,7 +27,11 @@ API_KEY_FROM_ENV = os.getenv("GOOGLE_STREET_VIEW_API_KEY")
 class StreetViewPanoLoader:
     """
     A ComfyUI node that creates a panorama by fetching multiple Street View
-    images and stitching them using OpenCV for a seamless result.
+    images and stitching them into a seamless result.
+
+    The default "geometry" mode projects every image onto the panorama canvas
+    from its known heading, pitch and fov and feather-blends the overlaps, which
+    is fast and deterministic. The "opencv" mode uses OpenCV's feature-based stitcher.
     """
 
     @classmethod
@@ -37,6 +48,8 @@ class StreetViewPanoLoader:
             # NEW: Optional input for Historical Date ID (Panorama ID)
             "optional": {
                 "historical_date_id": ("STRING", {"default": "", "multiline": False, "tooltip": "Enter a panorama ID to load a historical panorama from a specific date"}),
+                "max_concurrency": ("INT", {"default": 5, "min": 1, "max": 16, "step": 1, "tooltip": "Number of images fetched at the same time"}),
+                "stitch_mode": (["geometry", "opencv"], {"default": "geometry", "tooltip": "geometry: place images by their known camera angles (fast, deterministic). opencv: feature matching stitcher."}),
             }
         }
 
@@ -45,6 +58,19 @@ class StreetViewPanoLoader:
     FUNCTION = "load_panorama"
     CATEGORY = "Ru4ls/StreetView"
 
+    @classmethod
+    def IS_CHANGED(s, location, center_heading, pitch, fov_per_image, num_images, overlap_percentage, historical_date_id="", max_concurrency=5, stitch_mode="geometry", **kwargs):
+        step_angle = fov_per_image * (1 - (overlap_percentage / 100.0))
+        start_heading = center_heading - (step_angle * (num_images - 1) / 2.0)
+        plan = {
+            "views": [
+                normalize_request(location, (start_heading + i * step_angle) % 360, pitch, fov_per_image, 640, 640, historical_date_id)
+                for i in range(num_images)
+            ],
+            "stitch_mode": stitch_mode,
+        }
+        return plan_fingerprint(plan, pinned=bool(historical_date_id and historical_date_id.strip()))
+
     def simple_stitch(self, images, width, height):
         """ Fallback function for a simple side-by-side stitch if OpenCV fails. """
         total_width = width * len(images)
@@ -53,58 +79,97 @@ class StreetViewPanoLoader:
             stitched_image.paste(img, (i * width, 0))
         return stitched_image
 
-    def pil_to_tensor(self, image: Image.Image):
-        image_np = np.array(image).astype(np.float32) / 255.0
-        return torch.from_numpy(image_np)[None,]
+    def geometry_stitch(self, images, heading_offsets, pitch, fov, width, height):
+        """
+        Stitches the images from their known camera parameters (see projection.pano_stitch_tables).
+        `images` holds one uint8 array per heading offset, or None for views that failed.
+        The maps and weights are cached per layout, so repeated layouts only remap and blend.
+        """
+        with get_metrics().timer("stitch"):
+            tables = cached_pano_stitch_tables(heading_offsets, pitch, fov, width, height)
+            return blend_pano_views(images, tables)
+
+    def opencv_stitch(self, images, width, height):
+        """
+        Stitches the images with OpenCV's feature-based stitcher.
+
+        Returns:
+            A tuple of (PIL.Image, metadata_string); falls back to a side-by-side paste if stitching fails.
+        """
+        images_cv = [cv2.cvtColor(image, cv2.COLOR_RGB2BGR) for image in images]
+
+        stitcher = cv2.Stitcher_create()
+        with get_metrics().timer("stitch"):
+            (status, stitched_image_bgr) = stitcher.stitch(images_cv)
+
+        if status == cv2.Stitcher_OK:
+            print("StreetView Pano: OpenCV stitching successful!")
+            stitched_image_rgb = cv2.cvtColor(stitched_image_bgr, cv2.COLOR_BGR2RGB)
+            final_image = Image.fromarray(stitched_image_rgb)
+            return final_image, f"OpenCV Stitched {len(images)} images. Final size: {final_image.width}x{final_image.height}"
+
+        print(f"StreetView Pano: OpenCV stitching failed (Status code: {status}). Reason: Not enough matching features.")
+        print("  - FALLING BACK to simple side-by-side stitching. Try increasing overlap or changing FOV.")
+        final_image = self.simple_stitch([Image.fromarray(image) for image in images], width, height)
+        return final_image, f"STITCHING FAILED. Fallback to simple stitch. Size: {final_image.width}x{final_image.height}"
 
-    def load_panorama(self, location, center_heading, pitch, fov_per_image, num_images, overlap_percentage, historical_date_id=""):
+    @instrument_node("StreetViewPanoLoader")
+    async def load_panorama(self, location, center_heading, pitch, fov_per_image, num_images, overlap_percentage, historical_date_id="", max_concurrency=5, stitch_mode="geometry"):
         if not API_KEY_FROM_ENV:
             raise ValueError("Google Street View API key not found in .env file.")
 
-        images_pil = []
         width, height = 640, 640 # Fetch square images for max data
 
         # Calculate Headings Based on Overlap
         step_angle = fov_per_image * (1 - (overlap_percentage / 100.0))
         start_heading = center_heading - (step_angle * (num_images - 1) / 2.0)
+        heading_offsets = [start_heading + i * step_angle - center_heading for i in range(num_images)]
+
+        # Free metadata preflight: skip billed requests where there is no imagery and pin every request to one panorama
+        panorama = await asyncio.to_thread(preflight_panorama, API_KEY_FROM_ENV, location, historical_date_id)
+        if panorama.no_coverage:
+            print(f"StreetView Pano: No imagery at {location} ({panorama.status}), skipping all image requests.")
+            return (torch.zeros((1, height, width, 3), dtype=torch.float32), f"No Street View imagery available for this location ({panorama.status}).")
+        pano_id = panorama.pano_id if panorama.ok else historical_date_id
 
         print(f"StreetView Pano: Fetching {num_images} images with {fov_per_image}° FOV and {overlap_percentage}% overlap.")
 
-        for i in range(num_images):
+        def fetch_view(i):
             current_heading = (start_heading + i * step_angle) % 360
             print(f"  - Fetching image {i+1}/{num_images} at heading {current_heading:.2f}°...")
-            image_pil, _ = fetch_streetview_image(
+            result = fetch_streetview_array(
                 api_key=API_KEY_FROM_ENV,
                 location=location,
-                pano_id=historical_date_id,  # Pass the historical date ID if provided
+                pano_id=pano_id,  # The resolved (or requested) panorama ID overrides the location
                 heading=current_heading,
                 pitch=pitch,
                 fov=fov_per_image,
                 width=width,
-                height=height
+                height=height,
+                validate=True,
             )
-            if image_pil:
-                images_pil.append(image_pil)
+            if not result.ok:
+                print(f"  - Image {i+1}/{num_images} failed: {result.metadata}")
+                return None
+            return result.image
 
-        if not images_pil:
-            return (torch.zeros((1, height, width, 3), dtype=torch.float32), "Failed to fetch any images.")
-
-        # --- OpenCV Stitching ---
-        images_cv = [cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR) for img in images_pil]
+        # Fetch all views concurrently; results keep their left-to-right order for stitching
+        images = await map_concurrent_async(fetch_view, range(num_images), max_concurrency)
+        fetched = [image for image in images if image is not None]
 
-        stitcher = cv2.Stitcher_create()
-        (status, stitched_image_bgr) = stitcher.stitch(images_cv)
+        if not fetched:
+            return (torch.zeros((1, height, width, 3), dtype=torch.float32), "Failed to fetch any images.")
 
-        if status == cv2.Stitcher_OK:
-            print("StreetView Pano: OpenCV stitching successful!")
-            stitched_image_rgb = cv2.cvtColor(stitched_image_bgr, cv2.COLOR_BGR2RGB)
-            final_image = Image.fromarray(stitched_image_rgb)
-            metadata = f"OpenCV Stitched {len(images_pil)} images. Final size: {final_image.width}x{final_image.height}"
+        # Stitching is CPU bound; run it off the event loop
+        if stitch_mode == "opencv":
+            final_image, metadata = await asyncio.to_thread(self.opencv_stitch, fetched, width, height)
         else:
-            print(f"StreetView Pano: OpenCV stitching failed (Status code: {status}). Reason: Not enough matching features.")
-            print("  - FALLING BACK to simple side-by-side stitching. Try increasing overlap or changing FOV.")
-            final_image = self.simple_stitch(images_pil, width, height)
-            metadata = f"STITCHING FAILED. Fallback to simple stitch. Size: {final_image.width}x{final_image.height}"
+            # The stitched uint8 array goes straight to the tensor conversion, without a PIL copy
+            final_image = await asyncio.to_thread(self.geometry_stitch, images, heading_offsets, pitch, fov_per_image, width, height)
+            metadata = f"Geometry stitched {len(fetched)}/{num_images} images. Final size: {final_image.shape[1]}x{final_image.shape[0]}"
+
+        if panorama.ok:
+            metadata += f"\n{panorama.describe()}"
 
-        final_tensor = self.pil_to_tensor(final_image)
+        final_tensor = image_to_tensor(final_image)
         return (final_tensor, metadata)
\ No newline at end of file
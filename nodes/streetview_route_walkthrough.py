@@ -0,0 +1,173 @@
+# file: ComfyUI_StreetView-Loader/nodes/streetview_route_walkthrough.py
+
+import asyncio
+import torch
+import os
+from dotenv import load_dotenv
+
+from ..utils.async_fetch import ViewRequest, fetch_streetview_batch_async
+from ..utils.connect_api_utils import aspect_ratio_size
+from ..utils.concurrency import map_concurrent_async
+from ..utils.geo_utils import parse_coordinates, sample_polyline
+from ..utils.image_utils import allocate_image_batch, image_to_tensor
+from ..utils.pano_metadata import fetch_pano_metadata
+from ..utils.metrics import instrument_node
+from ..utils.fingerprint import plan_fingerprint
+
+# --- Load API Key from .env file ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+dotenv_path = os.path.join(parent_dir, '.env')
+load_dotenv(dotenv_path=dotenv_path)
+API_KEY_FROM_ENV = os.getenv("GOOGLE_STREET_VIEW_API_KEY")
+
+# Upper bound for the number of sample points, so a tiny spacing on a long route cannot explode
+MAX_ROUTE_SAMPLES = 5000
+
+
+class StreetViewRouteWalkthrough:
+    """
+    A ComfyUI node that creates a walkthrough sequence along a route.
+
+    The route (a polyline of coordinates) is sampled at a fixed spacing, every
+    sample is resolved to its panorama with the free metadata endpoint, and
+    consecutive samples that land on the same panorama are collapsed. Only the
+    remaining distinct panoramas are fetched, with the camera facing along the route.
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "route": ("STRING", {
+                    "multiline": True,
+                    "default": "40.758000,-73.985500\n40.759000,-73.985500\n40.759000,-73.984000",
+                    "tooltip": "Route vertices as lat,lng, one per line (or separated by ';')"
+                }),
+                "spacing_meters": ("FLOAT", {"default": 10.0, "min": 1.0, "max": 500.0, "step": 1.0, "tooltip": "Distance between sample points along the route"}),
+                "pitch": ("FLOAT", {"default": 0.0, "min": -90, "max": 90, "step": 0.1, "display": "slider"}),
+                "fov": ("INT", {"default": 90, "min": 10, "max": 120, "step": 1, "display": "slider"}),
+                "aspect_ratio": ([
+                    "1:1 Square (640x640)",
+                    "16:9 Widescreen (640x360)",
+                    "9:16 Vertical (360x640)",
+                    "4:3 Classic (640x480)",
+                    "3:2 Photography (640x427)"
+                ],),
+            },
+            "optional": {
+                "heading_offset": ("FLOAT", {"default": 0.0, "min": -180, "max": 180, "step": 0.1, "tooltip": "Added to the route direction (0 = look ahead, 180 = look back, 90 = look right)"}),
+                "max_concurrency": ("INT", {"default": 8, "min": 1, "max": 16, "step": 1, "tooltip": "Number of lookups/frames fetched at the same time"}),
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE", "STRING")
+    RETURN_NAMES = ("images", "metadata")
+    FUNCTION = "walk_route"
+    CATEGORY = "Ru4ls/StreetView"
+
+    @classmethod
+    def IS_CHANGED(s, route, spacing_meters, pitch, fov, aspect_ratio, heading_offset=0.0, **kwargs):
+        # The panoramas along a route are only known after the lookups, so a route is always "live"
+        try:
+            points = [f"{lat:.6f},{lng:.6f}" for lat, lng in parse_coordinates(route)]
+        except ValueError:
+            points = route
+        plan = {
+            "route": points,
+            "spacing": round(float(spacing_meters), 4),
+            "camera": [round(float(pitch), 4), int(fov), round(float(heading_offset), 4)],
+            "size": aspect_ratio_size(aspect_ratio),
+        }
+        return plan_fingerprint(plan, pinned=False)
+
+    def collapse_panoramas(self, samples, panoramas):
+        """
+        Drops samples without coverage and merges consecutive samples that
+        resolved to the same panorama (the first sample's route direction is kept).
+        Samples whose lookup failed are kept as plain location requests.
+
+        Returns:
+            A list of (sample, pano_id) pairs, pano_id is "" for unresolved samples.
+        """
+        stops = []
+        for sample, panorama in zip(samples, panoramas):
+            if panorama.no_coverage:
+                continue
+            pano_id = panorama.pano_id if panorama.ok else ""
+            if pano_id and stops and stops[-1][1] == pano_id:
+                continue
+            stops.append((sample, pano_id))
+        return stops
+
+    def fill_batch(self, batch, images):
+        for index, image in enumerate(images):
+            image_to_tensor(image, out=batch[index])
+
+    @instrument_node("StreetViewRouteWalkthrough")
+    async def walk_route(self, route, spacing_meters, pitch, fov, aspect_ratio, heading_offset=0.0, max_concurrency=8):
+        if not API_KEY_FROM_ENV:
+            raise ValueError("Google Street View API key not found in .env file. Please ensure GOOGLE_STREET_VIEW_API_KEY is set in ComfyUI_StreetView-Loader/.env")
+
+        # Determine width and height based on the selected aspect ratio
+        width, height = aspect_ratio_size(aspect_ratio)
+
+        points = parse_coordinates(route)
+        if not points:
+            raise ValueError("StreetView Route: The route is empty. Enter at least one lat,lng point.")
+
+        samples = sample_polyline(points, spacing_meters)
+        if len(samples) > MAX_ROUTE_SAMPLES:
+            raise ValueError(f"StreetView Route: {len(samples)} sample points exceed the limit of {MAX_ROUTE_SAMPLES}. Increase spacing_meters.")
+        route_length = samples[-1].distance
+
+        # Resolve every sample to its panorama (free metadata requests, cached per location)
+        print(f"StreetView Route: Resolving {len(samples)} samples along {route_length:.0f} m of route...")
+        panoramas = await map_concurrent_async(
+            lambda sample: fetch_pano_metadata(API_KEY_FROM_ENV, f"{sample.lat:.6f},{sample.lng:.6f}"),
+            samples,
+            max_concurrency,
+        )
+
+        stops = self.collapse_panoramas(samples, panoramas)
+        if not stops:
+            empty_tensor = torch.zeros((1, height, width, 3), dtype=torch.float32)
+            return (empty_tensor, f"Error: No Street View imagery found along the route ({len(samples)} samples).")
+
+        # One billed request per distinct panorama, facing along the route
+        views = [
+            ViewRequest(
+                location=f"{sample.lat:.6f},{sample.lng:.6f}",
+                heading=round((sample.bearing + heading_offset) % 360, 1),
+                pitch=pitch,
+                fov=fov,
+                width=width,
+                height=height,
+                pano_id=pano_id,
+            )
+            for sample, pano_id in stops
+        ]
+        print(f"StreetView Route: {len(samples)} samples collapsed to {len(views)} distinct panoramas, fetching...")
+        results = await fetch_streetview_batch_async(API_KEY_FROM_ENV, views, max_concurrency)
+
+        frames = [result.image for result in results if result.ok]
+        if not frames:
+            empty_tensor = torch.zeros((1, height, width, 3), dtype=torch.float32)
+            return (empty_tensor, f"Error: Failed to fetch any of the {len(views)} panoramas along the route.")
+
+        # Failed panoramas are left out so the walkthrough has no black frames
+        images = allocate_image_batch(len(frames), height, width)
+        await asyncio.to_thread(self.fill_batch, images, frames)
+
+        no_coverage = sum(1 for panorama in panoramas if panorama.no_coverage)
+        metadata = (
+            f"Route walkthrough: {route_length:.0f} m, {len(samples)} samples every {spacing_meters} m, "
+            f"{no_coverage} without coverage, {len(views)} distinct panoramas, {len(frames)} frames "
+            f"({len(views) - len(frames)} failed). API requests: {len(views)}\n"
+        )
+        metadata += "\n".join(
+            f"{index}: {view.pano_id or view.location} heading {view.heading}° {'ok' if result.ok else result.metadata}"
+            for index, (view, result) in enumerate(zip(views, results))
+        )
+
+        return (images, metadata)
@@ -0,0 +1,134 @@
+# file: ComfyUI_StreetView-Loader/utils/archive.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+ARCHIVE_MODES = ("off", "record", "replay")
+
+# Memory-mapped I/O window for reads (PRAGMA mmap_size)
+DEFAULT_MMAP_BYTES = 1 << 30
+
+
+class ArchiveMissError(LookupError):
+    """ Raised in replay mode when a request is not in the archive. """
+
+
+class ResponseArchive:
+    """
+    A single-file SQLite archive of raw Street View responses, for offline and
+    reproducible runs.
+
+    Entries are keyed by the content address of the normalized request (see
+    connect_api_utils.request_cache_key), so a lookup is one primary-key probe.
+    The database is read through SQLite's memory-mapped I/O (PRAGMA mmap_size),
+    so stored JPEGs are served from the OS page cache without read() calls.
+    Besides images, the archive stores "no image" answers and metadata lookups,
+    so a replay reproduces the recorded run exactly.
+    """
+
+    def __init__(self, path, mmap_bytes=DEFAULT_MMAP_BYTES, readonly=False):
+        self.path = path
+        if not readonly:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+        elif not os.path.exists(path):
+            raise FileNotFoundError(f"Street View archive '{path}' does not exist. Record it first with STREETVIEW_ARCHIVE_MODE=record.")
+
+        uri = f"file:{os.path.abspath(path)}{'?mode=ro' if readonly else ''}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=30)
+        self._conn.execute(f"PRAGMA mmap_size = {int(mmap_bytes)}")
+        if not readonly:
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"          # "image" or "metadata"
+                " status TEXT NOT NULL,"        # "ok", "no_image", or the metadata status
+                " request TEXT NOT NULL,"       # normalized request parameters (JSON)
+                " content_type TEXT,"
+                " content BLOB,"
+                " recorded_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        """ Returns (status, content, content_type) for the key, or None if it was not recorded. """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, content, content_type FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], row[2]
+
+    def contains(self, key):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key, kind, request, content, status="ok", content_type=""):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, kind, status, request, content_type, content, recorded_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, status, json.dumps(request, sort_keys=True), content_type,
+                 sqlite3.Binary(content) if content is not None else None, time.time()),
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- Process-wide instance, configured from the environment (.env) ---
+_archive = None
+_archive_config = None
+_archive_lock = threading.Lock()
+
+
+def archive_mode():
+    """ The configured STREETVIEW_ARCHIVE_MODE: "off" (default), "record" or "replay". """
+    mode = os.getenv("STREETVIEW_ARCHIVE_MODE", "off").strip().lower()
+    if mode not in ARCHIVE_MODES:
+        raise ValueError(f"Invalid STREETVIEW_ARCHIVE_MODE '{mode}'. Use one of: {', '.join(ARCHIVE_MODES)}.")
+    return mode
+
+
+def get_archive():
+    """
+    Returns the shared ResponseArchive, or None when the archive is off.
+
+    Configuration (environment variables):
+        STREETVIEW_ARCHIVE_MODE  - "record" stores every response fetched (or served from the
+                                   disk cache), "replay" serves requests only from the archive
+                                   and never touches the network (default "off")
+        STREETVIEW_ARCHIVE_PATH  - archive file (default: <node folder>/cache/streetview_archive.sqlite)
+    """
+    global _archive, _archive_config
+
+    mode = archive_mode()
+    if mode == "off":
+        return None
+
+    default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "streetview_archive.sqlite")
+    path = os.getenv("STREETVIEW_ARCHIVE_PATH") or default_path
+
+    with _archive_lock:
+        if _archive is None or _archive_config != (mode, path):
+            if _archive is not None:
+                _archive.close()
+            _archive = ResponseArchive(path, readonly=(mode == "replay"))
+            _archive_config = (mode, path)
+            print(f"StreetView Archive: {mode} mode, '{path}'")
+
+    return _archive
@@ -0,0 +1,46 @@
+# file: ComfyUI_StreetView-Loader/utils/async_fetch.py
+
+from collections import namedtuple
+
+from .concurrency import map_concurrent_async
+from .connect_api_utils import fetch_streetview_array, error_result
+from .rate_limiter import QuotaExceededError
+from .archive import ArchiveMissError
+
+# One view to fetch; pano_id overrides location when it is set
+ViewRequest = namedtuple("ViewRequest", ["location", "heading", "pitch", "fov", "width", "height", "pano_id"], defaults=("",))
+
+
+async def fetch_streetview_batch_async(api_key, views, max_concurrency=8):
+    """
+    Async counterpart of fetch_streetview_array for a list of ViewRequest items.
+
+    Requests run with at most `max_concurrency` in flight on the shared pooled
+    HTTP client (utils/http_client.py), each in a worker thread so the event loop
+    stays free. Identical views within the batch and across batches are still
+    served by the memory and disk caches.
+
+    Returns:
+        A list of FetchResult in the same order as `views`. A failing item never
+        aborts the batch: its result has ok=False, a black image and the error message.
+        The only exceptions are QuotaExceededError and ArchiveMissError (replay mode),
+        which are raised for the whole batch.
+    """
+    def fetch_one(view):
+        try:
+            return fetch_streetview_array(
+                api_key=api_key,
+                location=view.location,
+                heading=view.heading,
+                pitch=view.pitch,
+                fov=view.fov,
+                width=view.width,
+                height=view.height,
+                pano_id=view.pano_id,
+            )
+        except (QuotaExceededError, ArchiveMissError):
+            raise
+        except Exception as e:
+            return error_result(view.width, view.height, f"Error fetching view: {e}")
+
+    return await map_concurrent_async(fetch_one, views, max_concurrency)
@@ -0,0 +1,26 @@
+# file: ComfyUI_StreetView-Loader/utils/concurrency.py
+
+import asyncio
+
+# Upper bound for the per-node "max_concurrency" inputs
+MAX_CONCURRENCY_LIMIT = 16
+
+
+async def map_concurrent_async(func, items, max_workers):
+    """
+    Applies `func` to every item inside async node functions and returns the
+    results in the same order as `items`, regardless of completion order.
+
+    Each blocking call of `func` runs in a worker thread, at most `max_workers`
+    at a time, so the event loop is never blocked on network I/O. An exception
+    raised by `func` is re-raised here, so callers that need per-item fallbacks
+    should handle errors inside `func`.
+    """
+    items = list(items)
+    semaphore = asyncio.Semaphore(max(1, min(int(max_workers), MAX_CONCURRENCY_LIMIT)))
+
+    async def run(item):
+        async with semaphore:
+            return await asyncio.to_thread(func, item)
+
+    return await asyncio.gather(*(run(item) for item in items))
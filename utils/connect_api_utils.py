@@ -1,57 +1,251 @@
 # file: ComfyUI_StreetView-Loader\utils\connect_api_utils.py
 
+import hashlib
+import json
+import os
+import re
+from collections import namedtuple
+import numpy as np
 import requests
 from PIL import Image
-from io import BytesIO
 
-def fetch_streetview_image(api_key, location, heading, pitch, fov, width, height, pano_id=""):
+from .archive import get_archive, archive_mode, ArchiveMissError
+from .disk_cache import get_disk_cache
+from .http_client import get_client
+from .image_utils import decode_image_bytes, is_placeholder_image
+from .rate_limiter import get_rate_limiter, QuotaExceededError
+from .memory_cache import get_memory_cache
+from .metrics import get_metrics
+
+STREETVIEW_BASE_URL = "https://maps.googleapis.com/maps/api/streetview"
+
+# Output size of the "aspect_ratio" presets shared by the nodes (the API maximum is 640 per side)
+ASPECT_RATIO_SIZES = {
+    "1:1 Square (640x640)": (640, 640),
+    "16:9 Widescreen (640x360)": (640, 360),
+    "9:16 Vertical (360x640)": (360, 640),
+    "4:3 Classic (640x480)": (640, 480),
+    "3:2 Photography (640x427)": (640, 427),
+}
+
+# Matches the value of an API key query parameter in URLs and error messages
+_API_KEY_PATTERN = re.compile(r"(\bkey=)[^&\s'\"]+")
+
+# Result of fetch_streetview_array: a uint8 RGB array, the request URL (or error message), and a success flag
+FetchResult = namedtuple("FetchResult", ["image", "metadata", "ok"])
+
+
+def _format_number(value):
+    """ Formats a number with at most 4 decimals and no trailing zeros, so 90, 90.0 and 90.00001 share one form. """
+    text = f"{round(float(value), 4) + 0.0:.4f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def aspect_ratio_size(aspect_ratio):
+    """ Returns (width, height) for an aspect ratio preset, falling back to 640x640. """
+    return ASPECT_RATIO_SIZES.get(aspect_ratio, (640, 640))
+
+
+def streetview_base_url():
     """
-    Connects to the Google Street View API and fetches an image.
+    Returns the Street View endpoint. STREETVIEW_API_BASE_URL points the package
+    at another server, e.g. the local stand-in in benchmarks/stub_server.py.
+    """
+    return (os.getenv("STREETVIEW_API_BASE_URL") or STREETVIEW_BASE_URL).rstrip("/")
 
-    Returns:
-        A tuple containing (PIL.Image, metadata_url_string) on success,
-        or (error_image, error_message_string) on failure.
+
+def redact_api_key(text):
+    """ Replaces the value of every `key=` query parameter in a URL or message with REDACTED. """
+    return _API_KEY_PATTERN.sub(r"\1REDACTED", str(text))
+
+
+def normalize_request(location, heading, pitch, fov, width, height, pano_id=""):
     """
-    base_url = "https://maps.googleapis.com/maps/api/streetview"
+    Builds the canonical set of Street View request parameters (without the API key).
 
-    params = {
-        "size": f"{width}x{height}",
-        "heading": heading,
-        "pitch": pitch,
-        "fov": fov,
-        "key": api_key,
-        "return_error_codes": "true"
+    Equivalent requests (e.g. heading 360 vs 0, "lat, lng" vs "lat,lng", or a location
+    that is overridden by a pano ID) produce the same dictionary, which makes it usable
+    as a cache key.
+    """
+    request = {
+        "size": f"{int(width)}x{int(height)}",
+        "heading": _format_number(float(heading) % 360),
+        "pitch": _format_number(pitch),
+        "fov": _format_number(fov),
     }
 
-    # CRITICAL LOGIC:
     # If a Pano ID is provided, use it. It overrides the location.
     if pano_id and pano_id.strip() != "":
-        params["pano"] = pano_id
+        request["pano"] = pano_id.strip()
     else:
-        params["location"] = location
+        request["location"] = ",".join(part.strip() for part in str(location).split(","))
 
-    try:
-        response = requests.get(base_url, params=params, timeout=20)
-        response.raise_for_status()
+    return request
+
+
+def request_cache_key(request):
+    """ Returns a stable content address for a normalized request. """
+    payload = json.dumps(request, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def error_result(width, height, error_message):
+    return FetchResult(np.zeros((int(height), int(width), 3), dtype=np.uint8), error_message, False)
+
+
+def _validated(result, width, height, validate):
+    """ Turns a placeholder image into a failed FetchResult when validation is requested. """
+    if not validate or not result.ok or not is_placeholder_image(result.image):
+        return result
+    get_metrics().increment("placeholder_images")
+    return error_result(width, height, f"API returned a blank placeholder image: {result.metadata}")
+
+
+def fetch_streetview_array(api_key, location, heading, pitch, fov, width, height, pano_id="", validate=False):
+    """
+    Fetches a Street View image as a decoded RGB uint8 array.
+
+    Lookups go through two cache levels before touching the network:
+    the in-process decoded-frame cache (utils/memory_cache.py) and the
+    on-disk response cache (utils/disk_cache.py).
+
+    Returns:
+        A FetchResult(image, metadata, ok). On failure `image` is a black frame
+        of the requested size, `metadata` holds the error message and `ok` is False.
+        Arrays served from the memory cache are shared and read-only.
+        With validate=True, blank placeholder images (mostly black or a single
+        color, see image_utils.is_placeholder_image) are also reported as failures,
+        so callers can reject them before doing any further work.
+
+    With STREETVIEW_ARCHIVE_MODE=record every response used is also written to the
+    archive (utils/archive.py); with "replay" requests are served only from it.
+
+    Raises:
+        QuotaExceededError: If the daily request budget (utils/rate_limiter.py) is exhausted.
+        ArchiveMissError: In replay mode, if the request was not recorded.
+    """
+    base_url = streetview_base_url()
+
+    request = normalize_request(location, heading, pitch, fov, width, height, pano_id)
+    params = dict(request)
+    params["key"] = api_key
+    params["return_error_codes"] = "true"
+    # The URL is shown in logs and node outputs, so it never carries the API key
+    metadata_url = redact_api_key(requests.Request('GET', base_url, params=params).prepare().url)
+    cache_key = request_cache_key(request)
+    metrics = get_metrics()
+
+    archive = get_archive()
+    recording = archive is not None and archive_mode() == "record"
+
+    memory_cache = get_memory_cache()
+    if memory_cache is not None:
+        cached_frame = memory_cache.get(cache_key)
+        # While recording, a frame decoded before recording started still has to reach the archive
+        if cached_frame is not None and (not recording or archive.contains(cache_key)):
+            metrics.increment("cache_hits", level="memory")
+            return _validated(FetchResult(cached_frame[0], metadata_url, True), width, height, validate)
+
+    if archive is not None and not recording:
+        # Replay: the archive is the only source, the network is never used
+        archived = archive.get(cache_key)
+        if archived is None:
+            metrics.increment("archive_misses")
+            raise ArchiveMissError(
+                f"Street View request not found in the archive '{archive.path}': {json.dumps(request, sort_keys=True)}. "
+                f"Record it with STREETVIEW_ARCHIVE_MODE=record, or turn replay off."
+            )
+        status, content, _ = archived
+        metrics.increment("cache_hits", level="archive")
+        if status != "ok":
+            error_message = "API returned no image for this location. It might not be available. (replayed)"
+            print(f"StreetView Info: {error_message}")
+            return error_result(width, height, error_message)
+        print(f"StreetView URL (archive): {metadata_url}")
+        return _decode_and_cache(content, cache_key, memory_cache, metadata_url, width, height, validate)
+
+    disk_cache = get_disk_cache()
+    cached = disk_cache.get(cache_key) if disk_cache is not None else None
+    if cached is not None:
+        content, cached_metadata = cached
+        metrics.increment("cache_hits", level="disk")
+        if recording:
+            archive.put(cache_key, "image", request, content, "ok", cached_metadata.get("content_type", ""))
+        print(f"StreetView URL (cached): {metadata_url}")
+    else:
+        metrics.increment("cache_misses")
+        # Billed request: every attempt, retries included, goes through the shared rate limiter
+        try:
+            response = get_client().get(base_url, params=params, before_attempt=_acquire_billed_request)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            # A 404 is the API's "no imagery here" answer (return_error_codes=true): replay it too
+            if recording and getattr(e.response, "status_code", None) == 404:
+                archive.put(cache_key, "image", request, None, "no_image")
+            error_message = redact_api_key(f"An API request error occurred: {e}")
+            print(error_message)
+            return error_result(width, height, error_message)
+
+        content = response.content
+        metrics.increment("bytes_downloaded", len(content))
 
         # Check for "ZERO_RESULTS" or other API errors which still return a 200 OK status.
         # A valid JPEG starts with bytes FF D8. A valid PNG starts with 89 50 4E 47.
-        is_valid_image = response.content.startswith(b'\xff\xd8') or response.content.startswith(b'\x89PNG')
+        is_valid_image = content.startswith(b'\xff\xd8') or content.startswith(b'\x89PNG')
 
         if not is_valid_image:
+            metrics.increment("no_image_responses")
+            if recording:
+                archive.put(cache_key, "image", request, None, "no_image")
             error_message = "API returned no image for this location. It might not be available."
             print(f"StreetView Info: {error_message}")
-            error_img = Image.new('RGB', (width, height), color='black')
-            return (error_img, error_message)
+            return error_result(width, height, error_message)
 
-        # Success case
-        image_pil = Image.open(BytesIO(response.content)).convert("RGB")
-        metadata_url = requests.Request('GET', base_url, params=params).prepare().url
+        if disk_cache is not None:
+            try:
+                disk_cache.put(cache_key, content, {
+                    "request": request,
+                    "content_type": response.headers.get("Content-Type", ""),
+                })
+            except OSError as e:
+                print(f"StreetView Cache: Could not store response: {e}")
+        if recording:
+            archive.put(cache_key, "image", request, content, "ok", response.headers.get("Content-Type", ""))
         print(f"StreetView URL: {metadata_url}")
-        return (image_pil, metadata_url)
 
-    except requests.exceptions.RequestException as e:
-        error_message = f"An API request error occurred: {e}"
-        print(error_message)
-        error_img = Image.new('RGB', (width, height), color='black')
-        return (error_img, error_message)
\ No newline at end of file
+    return _decode_and_cache(content, cache_key, memory_cache, metadata_url, width, height, validate)
+
+
+def _acquire_billed_request():
+    """ Waits for the shared rate limiter before one billed attempt (raises QuotaExceededError when the daily budget is spent). """
+    metrics = get_metrics()
+    try:
+        with metrics.timer("rate_limit_wait"):
+            get_rate_limiter().acquire()
+    except QuotaExceededError:
+        metrics.increment("quota_rejections")
+        raise
+    metrics.increment("billed_requests")
+
+
+def _decode_and_cache(content, cache_key, memory_cache, metadata_url, width, height, validate):
+    """ Success case: decodes the response and keeps the frame in the memory cache. """
+    image_np = decode_image_bytes(content)
+    if memory_cache is not None:
+        image_np = memory_cache.put(cache_key, image_np)
+
+    return _validated(FetchResult(image_np, metadata_url, True), width, height, validate)
+
+
+def fetch_streetview_image(api_key, location, heading, pitch, fov, width, height, pano_id=""):
+    """
+    Connects to the Google Street View API and fetches an image.
+    Repeated identical requests are served from the memory and disk caches
+    (see fetch_streetview_array).
+
+    Returns:
+        A tuple containing (PIL.Image, metadata_url_string) on success,
+        or (error_image, error_message_string) on failure.
+    """
+    result = fetch_streetview_array(api_key, location, heading, pitch, fov, width, height, pano_id)
+    return (Image.fromarray(result.image), result.metadata)
@@ -0,0 +1,196 @@
+# file: ComfyUI_StreetView-Loader/utils/disk_cache.py
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class DiskCache:
+    """
+    A content-addressed, size-bounded on-disk cache for raw Street View responses.
+
+    Each entry is stored as two files inside a two-character shard directory:
+    `<key>.bin` holds the raw image bytes and `<key>.json` holds its metadata.
+    Entries are evicted least-recently-used first once the total size of the
+    stored bytes exceeds `max_bytes`. The last access time is persisted through
+    the file modification time so the LRU order survives a restart.
+    """
+
+    def __init__(self, directory, max_bytes, ttl_seconds=0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> size in bytes, oldest first
+        self._total_bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def _paths(self, key):
+        shard_dir = os.path.join(self.directory, key[:2])
+        return shard_dir, os.path.join(shard_dir, key + ".bin"), os.path.join(shard_dir, key + ".json")
+
+    def _load_index(self):
+        """ Rebuild the in-memory LRU index from the files already on disk. """
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".bin"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+        with self._lock:
+            self._evict_locked()
+
+    def _remove_locked(self, key):
+        size = self._index.pop(key, 0)
+        self._total_bytes -= size
+        _, data_path, meta_path = self._paths(key)
+        for path in (data_path, meta_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes and self._index:
+            oldest_key = next(iter(self._index))
+            self._remove_locked(oldest_key)
+
+    def get(self, key):
+        """
+        Returns a tuple of (bytes, metadata_dict) for the given key,
+        or None if the entry is missing or has expired.
+        """
+        with self._lock:
+            if key not in self._index:
+                return None
+
+            _, data_path, meta_path = self._paths(key)
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+                if self.ttl_seconds > 0 and time.time() - metadata.get("created", 0) > self.ttl_seconds:
+                    self._remove_locked(key)
+                    return None
+                with open(data_path, "rb") as f:
+                    data = f.read()
+            except (OSError, ValueError):
+                # Entry vanished or is corrupt (e.g. removed by another process)
+                self._remove_locked(key)
+                return None
+
+            self._index.move_to_end(key)
+            try:
+                os.utime(data_path, None)
+            except OSError:
+                pass
+
+        return data, metadata
+
+    def put(self, key, data, metadata=None):
+        """ Atomically stores the bytes and metadata under the given key. """
+        if len(data) > self.max_bytes:
+            return
+
+        metadata = dict(metadata or {})
+        metadata["created"] = time.time()
+        metadata["size"] = len(data)
+
+        shard_dir, data_path, meta_path = self._paths(key)
+
+        with self._lock:
+            os.makedirs(shard_dir, exist_ok=True)
+            # The data file is written first so a reader never finds metadata without its bytes
+            self._atomic_write(shard_dir, data_path, data)
+            self._atomic_write(shard_dir, meta_path, json.dumps(metadata).encode("utf-8"))
+
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict_locked()
+
+    def _atomic_write(self, directory, final_path, payload):
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                self._remove_locked(key)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def __len__(self):
+        return len(self._index)
+
+
+# --- Process-wide instance, configured from the environment (.env) ---
+# It is created lazily because the nodes load the .env file after importing this module.
+_disk_cache = None
+_disk_cache_lock = threading.Lock()
+
+
+def _env_float(name, default):
+    """ Reads a number from the environment; a malformed value is reported and the default is used. """
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"StreetView Cache: Ignoring invalid {name}={value!r}, using the default {default:g}.")
+        return default
+
+
+def get_disk_cache():
+    """
+    Returns the shared DiskCache instance, or None if the disk cache is disabled.
+
+    Configuration (environment variables):
+        STREETVIEW_DISK_CACHE        - "false" to disable the cache (default "true")
+        STREETVIEW_CACHE_DIR         - cache directory (default: <node folder>/cache)
+        STREETVIEW_CACHE_MAX_MB      - byte budget in megabytes (default 1024)
+        STREETVIEW_CACHE_TTL_HOURS   - entry lifetime in hours, 0 = never expire (default 0)
+    """
+    global _disk_cache
+
+    if os.getenv("STREETVIEW_DISK_CACHE", "true").strip().lower() in ("0", "false", "no", "off"):
+        return None
+
+    with _disk_cache_lock:
+        if _disk_cache is None:
+            default_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+            directory = os.getenv("STREETVIEW_CACHE_DIR") or default_dir
+            max_bytes = int(_env_float("STREETVIEW_CACHE_MAX_MB", 1024.0) * 1024 * 1024)
+            ttl_seconds = _env_float("STREETVIEW_CACHE_TTL_HOURS", 0.0) * 3600
+            try:
+                _disk_cache = DiskCache(directory, max_bytes, ttl_seconds)
+            except OSError as e:
+                print(f"StreetView Cache: Disk cache disabled, could not use '{directory}': {e}")
+                _disk_cache = False
+
+    return _disk_cache if _disk_cache is not False else None
@@ -0,0 +1,37 @@
+# file: ComfyUI_StreetView-Loader/utils/fingerprint.py
+
+import hashlib
+import json
+import os
+import time
+
+from .connect_api_utils import streetview_base_url
+
+
+def live_fingerprint_ttl():
+    """ Seconds after which fingerprints of live (unpinned) requests change; 0 = never. """
+    return float(os.getenv("STREETVIEW_LIVE_CACHE_TTL_HOURS", "0")) * 3600.0
+
+
+def plan_fingerprint(plan, pinned):
+    """
+    Computes the value returned by a node's IS_CHANGED from its normalized request plan.
+
+    Args:
+        plan: A JSON-serializable description of everything the node would
+              request and how it would assemble the output (normalized requests,
+              output options). Equivalent inputs must produce an equal plan.
+        pinned: True when every request targets a fixed panorama ID. The imagery
+                behind a pano ID never changes, so the fingerprint stays stable.
+
+    For live locations, Google may publish newer imagery. When
+    STREETVIEW_LIVE_CACHE_TTL_HOURS is set, the fingerprint of an unpinned plan
+    changes once per TTL period, so ComfyUI re-executes the node and fetches
+    fresh imagery. Otherwise identical graphs are reused from ComfyUI's cache.
+    """
+    payload = {"plan": plan, "endpoint": streetview_base_url()}
+    ttl = live_fingerprint_ttl()
+    if not pinned and ttl > 0:
+        payload["period"] = int(time.time() // ttl)
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
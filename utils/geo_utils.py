@@ -0,0 +1,90 @@
+# file: ComfyUI_StreetView-Loader/utils/geo_utils.py
+
+import math
+from collections import namedtuple
+
+EARTH_RADIUS_METERS = 6371008.8
+
+# A point sampled along a route; bearing is the route direction there (degrees clockwise from north)
+RouteSample = namedtuple("RouteSample", ["lat", "lng", "bearing", "distance"])
+
+
+def parse_coordinates(text):
+    """
+    Parses "lat,lng" pairs separated by new lines, semicolons or "|" into a list of (lat, lng) floats.
+    Blank entries and lines starting with # are skipped.
+    """
+    points = []
+    for line in text.splitlines():
+        if line.strip().startswith("#"):
+            continue
+        for entry in line.replace("|", ";").split(";"):
+            if not entry.strip():
+                continue
+            parts = [part.strip() for part in entry.split(",")]
+            if len(parts) != 2:
+                raise ValueError(f"Expected 'lat,lng' but got '{entry.strip()}'")
+            lat, lng = float(parts[0]), float(parts[1])
+            if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+                raise ValueError(f"Coordinate out of range: '{entry.strip()}'")
+            points.append((lat, lng))
+    return points
+
+
+def haversine_distance(a, b):
+    """ Great-circle distance in meters between two (lat, lng) points. """
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(min(1.0, math.sqrt(h)))
+
+
+def initial_bearing(a, b):
+    """ Compass bearing in degrees [0, 360) when travelling from point a to point b. """
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    y = math.sin(lng2 - lng1) * math.cos(lat2)
+    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(lng2 - lng1)
+    return math.degrees(math.atan2(y, x)) % 360
+
+
+def sample_polyline(points, spacing):
+    """
+    Samples a polyline every `spacing` meters, starting at its first point and
+    always including its last point.
+
+    Points between vertices are interpolated linearly in latitude/longitude,
+    which is accurate at Street View distances (segments of a few km or less).
+
+    Returns:
+        A list of RouteSample. Each sample carries the bearing of the segment it
+        lies on and its distance along the route.
+    """
+    # Drop repeated vertices: they have no direction
+    vertices = [point for i, point in enumerate(points) if i == 0 or point != points[i - 1]]
+    if not vertices:
+        return []
+    if len(vertices) == 1:
+        return [RouteSample(vertices[0][0], vertices[0][1], 0.0, 0.0)]
+
+    spacing = max(float(spacing), 0.1)
+    samples = []
+    travelled = 0.0     # distance at the start of the current segment
+    next_sample = 0.0   # distance of the next sample along the route
+
+    for start, end in zip(vertices, vertices[1:]):
+        length = haversine_distance(start, end)
+        bearing = initial_bearing(start, end)
+        while next_sample <= travelled + length:
+            t = (next_sample - travelled) / length if length > 0 else 0.0
+            samples.append(RouteSample(
+                lat=start[0] + (end[0] - start[0]) * t,
+                lng=start[1] + (end[1] - start[1]) * t,
+                bearing=bearing,
+                distance=next_sample,
+            ))
+            next_sample += spacing
+        travelled += length
+
+    last = vertices[-1]
+    if travelled - samples[-1].distance > 1e-6:
+        samples.append(RouteSample(last[0], last[1], samples[-1].bearing, travelled))
+    return samples
@@ -0,0 +1,30 @@
+# file: ComfyUI_StreetView-Loader/utils/graph_utils.py
+
+
+def linked_output_indices(prompt, unique_id):
+    """
+    Finds which outputs of a node are consumed by other nodes in the queued graph.
+
+    Args:
+        prompt: The API-format prompt (ComfyUI hidden input "PROMPT").
+        unique_id: The id of the node (ComfyUI hidden input "UNIQUE_ID").
+
+    Returns:
+        A set of output slot indices that are linked to another node's input,
+        or None if the graph is not available (callers should then assume all
+        outputs are used).
+    """
+    if not prompt or unique_id is None:
+        return None
+
+    node_id = str(unique_id)
+    linked = set()
+    for node in prompt.values():
+        for value in node.get("inputs", {}).values():
+            # Links are encoded as [source_node_id, source_output_index]
+            if isinstance(value, list) and len(value) == 2 and str(value[0]) == node_id:
+                try:
+                    linked.add(int(value[1]))
+                except (TypeError, ValueError):
+                    continue
+    return linked
@@ -0,0 +1,146 @@
+# file: ComfyUI_StreetView-Loader/utils/http_client.py
+
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import get_metrics
+
+
+class StreetViewClient:
+    """
+    A thread-safe HTTP client for the Street View API.
+
+    It keeps one pooled `requests.Session` so consecutive requests reuse their
+    TCP/TLS connections, and retries transient failures (connection errors,
+    timeouts, 429 and 5xx responses) with jittered exponential backoff.
+    A `Retry-After` header sent by the server takes precedence over the backoff.
+    """
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, pool_size=16, max_retries=3, backoff_base=0.5, backoff_max=30.0,
+                 connect_timeout=5.0, read_timeout=20.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        # pool_block keeps the number of open connections at pool_size under heavy concurrency
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff_delay(self, attempt):
+        """ Full-jitter exponential backoff: a random delay in [0, base * 2^attempt], capped at backoff_max. """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after_delay(self, response):
+        """ Returns the delay requested by a Retry-After header (seconds or HTTP date), or None. """
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+        return min(max(delay, 0.0), self.backoff_max)
+
+    def get(self, url, params=None, before_attempt=None):
+        """
+        Performs a GET request with retries.
+
+        `before_attempt`, if given, is called before every attempt, retries included.
+        Billed requests pass the shared rate limiter's acquire here, so each retry is
+        throttled and counted against the daily budget like the first attempt; any
+        exception it raises (e.g. QuotaExceededError) propagates to the caller.
+
+        Each attempt is recorded in utils/metrics.py as two stages: "http_wait"
+        (sending the request until the response headers arrive, which includes
+        DNS, connect and TLS when no pooled connection is free) and "http_transfer"
+        (reading the body). Retries and backoff sleeps are recorded as well.
+
+        Returns the final `requests.Response` (which may still carry a retryable
+        status code once the retries are exhausted). Connection errors and timeouts
+        are re-raised after the last attempt.
+        """
+        metrics = get_metrics()
+        attempt = 0
+        while True:
+            if before_attempt is not None:
+                before_attempt()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.increment("http_errors", reason=type(e).__name__)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                print(f"StreetView HTTP: {type(e).__name__}, retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            else:
+                # response.elapsed stops when the headers are parsed; the body is read after that
+                total = time.perf_counter() - start
+                wait = min(response.elapsed.total_seconds(), total)
+                metrics.observe("http_wait", wait)
+                metrics.observe("http_transfer", total - wait)
+                metrics.increment("http_responses", status=response.status_code)
+                if response.status_code not in self.RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_after_delay(response)
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                print(f"StreetView HTTP: Status {response.status_code}, retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+                response.close()
+
+            metrics.increment("http_retries")
+            metrics.observe("http_backoff", delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+
+# --- Process-wide instance, configured from the environment (.env) ---
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the shared StreetViewClient instance.
+
+    Configuration (environment variables):
+        STREETVIEW_HTTP_POOL_SIZE        - max pooled connections (default 16)
+        STREETVIEW_HTTP_MAX_RETRIES      - retries for transient errors (default 3)
+        STREETVIEW_HTTP_BACKOFF_SECONDS  - base delay of the exponential backoff (default 0.5)
+        STREETVIEW_CONNECT_TIMEOUT       - connect timeout in seconds (default 5)
+        STREETVIEW_READ_TIMEOUT          - read timeout in seconds (default 20)
+    """
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = StreetViewClient(
+                pool_size=int(os.getenv("STREETVIEW_HTTP_POOL_SIZE", "16")),
+                max_retries=int(os.getenv("STREETVIEW_HTTP_MAX_RETRIES", "3")),
+                backoff_base=float(os.getenv("STREETVIEW_HTTP_BACKOFF_SECONDS", "0.5")),
+                connect_timeout=float(os.getenv("STREETVIEW_CONNECT_TIMEOUT", "5")),
+                read_timeout=float(os.getenv("STREETVIEW_READ_TIMEOUT", "20")),
+            )
+
+    return _client
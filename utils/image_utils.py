@@ -0,0 +1,186 @@
+# file: ComfyUI_StreetView-Loader/utils/image_utils.py
+
+import glob
+import mmap
+import os
+import tempfile
+import weakref
+
+import numpy as np
+import torch
+import cv2
+from PIL import Image
+from io import BytesIO
+
+from .metrics import get_metrics
+
+
+def decode_image_bytes(content):
+    """
+    Decodes JPEG/PNG bytes straight into an RGB uint8 array of shape (height, width, 3).
+
+    OpenCV decodes into a single BGR buffer which is then converted to RGB in place,
+    so no intermediate PIL image or extra array copy is created. PIL is only used as
+    a fallback for data OpenCV cannot decode.
+    """
+    with get_metrics().timer("decode"):
+        image_np = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image_np is None:
+            return np.array(Image.open(BytesIO(content)).convert("RGB"))
+        return cv2.cvtColor(image_np, cv2.COLOR_BGR2RGB, dst=image_np)
+
+
+def is_placeholder_image(image_np, dark_fraction=0.9, min_std=5.0, max_samples=4096):
+    """
+    Detects the mostly-black or single-color images the API returns instead of
+    real imagery (e.g. at extreme pitches or where there is no coverage).
+
+    The statistics are computed on a strided subsample of about `max_samples`
+    pixels, so the cost does not grow with the image size.
+    """
+    height, width = image_np.shape[:2]
+    step = max(1, int((height * width / max_samples) ** 0.5))
+    sample = image_np[::step, ::step]
+
+    # Mostly very dark pixels (values under 30/255): typical for failed requests
+    if np.count_nonzero(sample < 30) / sample.size > dark_fraction:
+        return True
+    # A very low standard deviation means a uniform color
+    return float(sample.std()) < min_std
+
+
+def image_to_tensor(image, out=None):
+    """
+    Converts a uint8 RGB image (numpy array or PIL Image) to the float tensor format ComfyUI expects.
+
+    The uint8 -> float conversion and the normalization to [0, 1] happen in a single pass
+    that writes directly into the output buffer.
+
+    Args:
+        image: An RGB image as a (H, W, 3) uint8 array or a PIL Image.
+        out: Optional CPU tensor of shape (H, W, 3) (e.g. a slice of a preallocated batch)
+             to write into. Its dtype is kept: float32/float16 are normalized to [0, 1],
+             uint8 receives the raw 0-255 values.
+
+    Returns:
+        A tensor of shape (1, H, W, 3), or `out` itself when it is given.
+    """
+    with get_metrics().timer("tensor"):
+        image_np = np.asarray(image)
+        if image_np.ndim == 2:
+            image_np = np.repeat(image_np[:, :, None], 3, axis=2)
+
+        if out is None:
+            tensor = torch.empty((1,) + image_np.shape, dtype=torch.float32)
+            np.divide(image_np, np.float32(255.0), out=tensor.numpy()[0], casting="unsafe")
+            return tensor
+
+        if out.dtype == torch.uint8:
+            np.copyto(out.numpy(), image_np)
+        else:
+            np.divide(image_np, np.float32(255.0), out=out.numpy(), casting="unsafe")
+        return out
+
+
+# Name prefix of the temporary files behind memory-mapped batches
+MEMMAP_FILE_PREFIX = "streetview_batch_"
+
+BATCH_PRECISIONS = {
+    "float32": (torch.float32, np.float32),
+    "float16": (torch.float16, np.float16),
+    "uint8": (torch.uint8, np.uint8),
+}
+
+
+def allocate_image_batch(count, height, width, precision="float32", memmap=False):
+    """
+    Allocates an uninitialized (count, height, width, 3) image batch to be filled in place.
+
+    Args:
+        precision: "float32" (ComfyUI default), "float16" (half the memory) or
+                   "uint8" (a quarter of the memory, raw 0-255 values).
+        memmap: Back the batch with a memory-mapped temporary file instead of RAM,
+                so very long sequences are paged to disk by the OS. The folder is
+                STREETVIEW_MEMMAP_DIR or the system temp folder.
+    """
+    torch_dtype, numpy_dtype = BATCH_PRECISIONS.get(precision, BATCH_PRECISIONS["float32"])
+    shape = (count, height, width, 3)
+
+    if not memmap:
+        return torch.empty(shape, dtype=torch_dtype)
+
+    directory = os.getenv("STREETVIEW_MEMMAP_DIR") or None
+    if os.name == "nt":
+        _remove_stale_batch_files(directory or tempfile.gettempdir())
+
+    fd, path = tempfile.mkstemp(prefix=MEMMAP_FILE_PREFIX, suffix=".bin", dir=directory)
+    nbytes = int(np.prod(shape)) * np.dtype(numpy_dtype).itemsize
+    with os.fdopen(fd, "w+b") as f:
+        f.truncate(nbytes)
+        mapping = mmap.mmap(f.fileno(), nbytes)
+    try:
+        # On POSIX systems the mapping stays valid and the disk space is released with the tensor
+        os.remove(path)
+    except OSError:
+        # Windows cannot delete a mapped file: remove it once the mapping is closed with the tensor
+        weakref.finalize(mapping, _remove_batch_file, path)
+    return torch.from_numpy(np.frombuffer(mapping, dtype=numpy_dtype).reshape(shape))
+
+
+def _remove_batch_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"StreetView Memmap: Could not remove temporary file '{path}', it is removed on a later allocation: {e}")
+
+
+def _remove_stale_batch_files(directory):
+    """ Removes batch files left behind by earlier runs; files that are still mapped cannot be deleted and are kept. """
+    for path in glob.glob(os.path.join(directory, MEMMAP_FILE_PREFIX + "*.bin")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Rows (or square blocks of this side) moved at a time by the in-place transforms below,
+# so their temporary buffers stay small however large the image is.
+IN_PLACE_BLOCK = 256
+
+
+def flip_columns_in_place(image):
+    """ Mirrors an (H, W, C) array left-right in place, one band of rows at a time. """
+    for start in range(0, image.shape[0], IN_PLACE_BLOCK):
+        band = image[start:start + IN_PLACE_BLOCK]
+        band[...] = band[:, ::-1].copy()
+    return image
+
+
+def flip_rows_in_place(image):
+    """ Mirrors an (H, W, C) array top-bottom in place by swapping bands of rows from both ends. """
+    height = image.shape[0]
+    for start in range(0, height // 2, IN_PLACE_BLOCK):
+        stop = min(start + IN_PLACE_BLOCK, height // 2)
+        top = image[start:stop].copy()
+        image[start:stop] = image[height - stop:height - start][::-1]
+        image[height - stop:height - start] = top[::-1]
+    return image
+
+
+def transpose_in_place(image):
+    """ Transposes a square (S, S, C) array in place by swapping mirrored blocks. """
+    size = image.shape[0]
+    if image.shape[1] != size:
+        raise ValueError("transpose_in_place needs a square image.")
+    for row in range(0, size, IN_PLACE_BLOCK):
+        for col in range(row, size, IN_PLACE_BLOCK):
+            upper = image[row:row + IN_PLACE_BLOCK, col:col + IN_PLACE_BLOCK].copy()
+            if col == row:
+                image[row:row + IN_PLACE_BLOCK, col:col + IN_PLACE_BLOCK] = upper.transpose(1, 0, 2)
+                continue
+            lower = image[col:col + IN_PLACE_BLOCK, row:row + IN_PLACE_BLOCK].copy()
+            image[row:row + IN_PLACE_BLOCK, col:col + IN_PLACE_BLOCK] = lower.transpose(1, 0, 2)
+            image[col:col + IN_PLACE_BLOCK, row:row + IN_PLACE_BLOCK] = upper.transpose(1, 0, 2)
+    return image
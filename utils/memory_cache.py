@@ -0,0 +1,95 @@
+# file: ComfyUI_StreetView-Loader/utils/memory_cache.py
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class DecodedImageCache:
+    """
+    A process-wide LRU cache of decoded Street View frames (uint8 numpy arrays).
+
+    The cache is bounded by the total number of bytes held, not by the number of
+    entries, so a few large faces and many small frames share the same budget.
+    Stored arrays are marked read-only because they are handed out to every caller
+    without copying.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (array, metadata), oldest first
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """ Returns (array, metadata) for the key, or None on a miss. """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, array, metadata=None):
+        if array.nbytes > self.max_bytes:
+            return array
+
+        array.setflags(write=False)
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[0].nbytes
+            self._entries[key] = (array, metadata)
+            self._total_bytes += array.nbytes
+
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.nbytes
+                self.evictions += 1
+
+        return array
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """ Returns a snapshot of the cache counters. """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# --- Process-wide instance, configured from the environment (.env) ---
+_memory_cache = None
+_memory_cache_lock = threading.Lock()
+
+
+def get_memory_cache():
+    """
+    Returns the shared DecodedImageCache instance, or None if it is disabled.
+
+    Configuration (environment variables):
+        STREETVIEW_MEMORY_CACHE_MB - byte budget in megabytes, 0 disables the cache (default 512)
+    """
+    global _memory_cache
+
+    with _memory_cache_lock:
+        if _memory_cache is None:
+            max_bytes = int(float(os.getenv("STREETVIEW_MEMORY_CACHE_MB", "512")) * 1024 * 1024)
+            _memory_cache = DecodedImageCache(max_bytes) if max_bytes > 0 else False
+
+    return _memory_cache if _memory_cache is not False else None
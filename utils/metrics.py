@@ -0,0 +1,245 @@
+# file: ComfyUI_StreetView-Loader/utils/metrics.py
+
+import contextvars
+import functools
+import os
+import tempfile
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+# One recorded measurement, as passed to hooks. kind is "timer" or "counter".
+MetricEvent = namedtuple("MetricEvent", ["kind", "name", "value", "labels"])
+
+# Upper bounds (seconds) of the Prometheus histogram buckets used for every stage timer
+TIMER_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Number of recent samples per timer kept for the percentiles in snapshot()
+_SAMPLE_WINDOW = 1024
+
+# Name of the node currently executing in this thread/task (propagated into asyncio.to_thread workers)
+_current_node = contextvars.ContextVar("streetview_current_node", default="")
+
+
+def _series_key(name, labels):
+    node = _current_node.get()
+    if node and "node" not in labels:
+        labels = dict(labels, node=node)
+    return name, tuple(sorted(labels.items()))
+
+
+class _TimerSeries:
+    __slots__ = ("count", "total", "max", "buckets", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(TIMER_BUCKETS)
+        self.samples = deque(maxlen=_SAMPLE_WINDOW)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+        for i, bound in enumerate(TIMER_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Metrics:
+    """
+    Process-wide, thread-safe counters and per-stage timers.
+
+    Every measurement carries labels; the name of the node being executed is
+    added automatically (see instrument_node). Hooks registered with add_hook
+    receive each MetricEvent as it is recorded, e.g. to forward them to an
+    external monitoring system. Hooks run on the recording thread and must be fast.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+        self._hooks = []
+
+    def add_hook(self, hook):
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def _emit(self, event):
+        for hook in self._hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                print(f"StreetView Metrics: Hook {hook!r} failed: {e}")
+
+    def increment(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = _series_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        if self._hooks:
+            self._emit(MetricEvent("counter", name, value, dict(key[1])))
+
+    def observe(self, stage, seconds, **labels):
+        if not self.enabled:
+            return
+        key = _series_key(stage, labels)
+        with self._lock:
+            series = self._timers.get(key)
+            if series is None:
+                series = self._timers[key] = _TimerSeries()
+            series.add(seconds)
+        if self._hooks:
+            self._emit(MetricEvent("timer", stage, seconds, dict(key[1])))
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """ Times the enclosed block as one sample of `stage` (also when it raises). """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def snapshot(self):
+        """
+        Returns a plain dictionary of everything recorded so far:
+            {"counters": [{"name", "labels", "value"}, ...],
+             "timers": [{"name", "labels", "count", "total_seconds", "mean_seconds",
+                         "max_seconds", "p50_seconds", "p99_seconds"}, ...]}
+        Percentiles are computed over the most recent samples of each timer.
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            timers = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": series.count,
+                    "total_seconds": series.total,
+                    "mean_seconds": series.total / series.count if series.count else 0.0,
+                    "max_seconds": series.max,
+                    "p50_seconds": series.percentile(0.5),
+                    "p99_seconds": series.percentile(0.99),
+                }
+                for (name, labels), series in sorted(self._timers.items())
+            ]
+        return {"counters": counters, "timers": timers}
+
+    def prometheus_text(self):
+        """ Renders all metrics in the Prometheus text exposition format. """
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            counter_names = sorted({name for name, _ in self._counters})
+            for metric in counter_names:
+                lines.append(f"# TYPE streetview_{metric}_total counter")
+                for (name, labels), value in sorted(self._counters.items()):
+                    if name == metric:
+                        lines.append(f"streetview_{metric}_total{format_labels(labels)} {value}")
+
+            timer_names = sorted({name for name, _ in self._timers})
+            for metric in timer_names:
+                lines.append(f"# TYPE streetview_{metric}_seconds histogram")
+                for (name, labels), series in sorted(self._timers.items()):
+                    if name != metric:
+                        continue
+                    for bound, count in zip(TIMER_BUCKETS, series.buckets):
+                        lines.append(f"streetview_{metric}_seconds_bucket{format_labels(labels, [('le', bound)])} {count}")
+                    lines.append(f"streetview_{metric}_seconds_bucket{format_labels(labels, [('le', '+Inf')])} {series.count}")
+                    lines.append(f"streetview_{metric}_seconds_sum{format_labels(labels)} {series.total:.6f}")
+                    lines.append(f"streetview_{metric}_seconds_count{format_labels(labels)} {series.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """ Atomically writes prometheus_text() to `path` (e.g. for the node_exporter textfile collector). """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(prefix=".streetview_metrics_", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+# --- Process-wide instance, configured from the environment (.env) ---
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """
+    Returns the shared Metrics instance.
+
+    Configuration (environment variables):
+        STREETVIEW_METRICS       - set to "false" to turn all recording off (default true)
+        STREETVIEW_METRICS_FILE  - if set, the Prometheus text dump is written to this
+                                   file after every node execution
+    """
+    global _metrics
+
+    with _metrics_lock:
+        if _metrics is None:
+            enabled = os.getenv("STREETVIEW_METRICS", "true").strip().lower() not in ("0", "false", "no", "off")
+            _metrics = Metrics(enabled=enabled)
+
+    return _metrics
+
+
+def instrument_node(node_name):
+    """
+    Decorator for async node functions: labels every metric recorded while the
+    node runs with its name, times the whole execution as the "node" stage and
+    writes the Prometheus dump afterwards when STREETVIEW_METRICS_FILE is set.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = _current_node.set(node_name)
+            try:
+                with get_metrics().timer("node"):
+                    return await func(*args, **kwargs)
+            finally:
+                _current_node.reset(token)
+                metrics_file = os.getenv("STREETVIEW_METRICS_FILE")
+                if metrics_file:
+                    try:
+                        get_metrics().write_prometheus(metrics_file)
+                    except OSError as e:
+                        print(f"StreetView Metrics: Could not write {metrics_file}: {e}")
+        return wrapper
+    return decorator
@@ -0,0 +1,167 @@
+# file: ComfyUI_StreetView-Loader/utils/pano_metadata.py
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import requests
+
+from .archive import get_archive, archive_mode, ArchiveMissError
+from .connect_api_utils import streetview_base_url, redact_api_key, request_cache_key
+from .http_client import get_client
+from .metrics import get_metrics
+
+# Statuses of the metadata endpoint that mean "there is no imagery here"
+NO_COVERAGE_STATUSES = ("ZERO_RESULTS", "NOT_FOUND")
+
+
+class PanoMetadata(namedtuple("PanoMetadata", ["status", "pano_id", "date", "lat", "lng", "copyright"])):
+    """
+    Result of a Street View metadata lookup.
+
+    `status` is the API status ("OK", "ZERO_RESULTS", "NOT_FOUND", ...), "DISABLED"
+    when the preflight is turned off, or "ERROR" when the lookup itself failed.
+    """
+
+    @property
+    def ok(self):
+        return self.status == "OK"
+
+    @property
+    def no_coverage(self):
+        return self.status in NO_COVERAGE_STATUSES
+
+    def describe(self):
+        """ A short line for the node metadata outputs. """
+        if self.ok:
+            return f"Panorama: {self.pano_id} (captured {self.date or 'unknown date'}) at {self.lat:.6f},{self.lng:.6f}"
+        return f"Panorama: not resolved ({self.status})"
+
+
+def _unresolved(status):
+    return PanoMetadata(status, "", "", 0.0, 0.0, "")
+
+
+def _preflight_enabled():
+    return os.getenv("STREETVIEW_METADATA_PREFLIGHT", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+# --- Process-wide lookup cache: (location or pano id) -> (PanoMetadata, stored_at) ---
+_MAX_CACHED_LOCATIONS = 4096
+_metadata_cache = OrderedDict()
+_metadata_cache_lock = threading.Lock()
+
+
+def _metadata_cache_ttl():
+    return float(os.getenv("STREETVIEW_METADATA_CACHE_TTL_HOURS", "24")) * 3600.0
+
+
+def clear_metadata_cache():
+    with _metadata_cache_lock:
+        _metadata_cache.clear()
+
+
+def fetch_pano_metadata(api_key, location, pano_id=""):
+    """
+    Looks up the panorama served for a location (or pano ID) on the Street View
+    metadata endpoint. Metadata requests are free: they are not billed and do not
+    count against the rate limiter or the daily budget.
+
+    Definitive answers (a resolved panorama, or no coverage) are cached per
+    location for STREETVIEW_METADATA_CACHE_TTL_HOURS (default 24). Network errors
+    and other API statuses are not cached and never raise.
+
+    Lookups are recorded to and replayed from the response archive like images
+    (utils/archive.py); in replay mode a lookup that was not recorded raises
+    ArchiveMissError.
+
+    Returns:
+        A PanoMetadata.
+    """
+    if pano_id and pano_id.strip() != "":
+        params = {"pano": pano_id.strip()}
+    else:
+        params = {"location": ",".join(part.strip() for part in str(location).split(","))}
+    cache_key = tuple(sorted(params.items()))
+    archive_key = request_cache_key(dict(params, endpoint="metadata"))
+
+    archive = get_archive()
+    recording = archive is not None and archive_mode() == "record"
+
+    ttl = _metadata_cache_ttl()
+    with _metadata_cache_lock:
+        cached = _metadata_cache.get(cache_key)
+        if cached is not None and recording and not archive.contains(archive_key):
+            cached = None
+        if cached is not None:
+            metadata, stored_at = cached
+            if ttl <= 0 or time.time() - stored_at < ttl:
+                _metadata_cache.move_to_end(cache_key)
+                get_metrics().increment("cache_hits", level="metadata")
+                return metadata
+            del _metadata_cache[cache_key]
+
+    if archive is not None and not recording:
+        archived = archive.get(archive_key)
+        if archived is None:
+            get_metrics().increment("archive_misses")
+            raise ArchiveMissError(
+                f"Street View metadata lookup not found in the archive '{archive.path}': {json.dumps(params, sort_keys=True)}. "
+                f"Record it with STREETVIEW_ARCHIVE_MODE=record, or turn replay off."
+            )
+        payload = json.loads(archived[1])
+    else:
+        request_params = dict(params, key=api_key)
+        get_metrics().increment("metadata_requests")
+        try:
+            response = get_client().get(f"{streetview_base_url()}/metadata", params=request_params)
+            response.raise_for_status()
+            payload = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"StreetView Metadata: Lookup failed, continuing without preflight: {redact_api_key(e)}")
+            return _unresolved("ERROR")
+
+    status = payload.get("status", "ERROR")
+    if status == "OK":
+        position = payload.get("location") or {}
+        metadata = PanoMetadata(
+            status=status,
+            pano_id=payload.get("pano_id", ""),
+            date=payload.get("date", ""),
+            lat=float(position.get("lat", 0.0)),
+            lng=float(position.get("lng", 0.0)),
+            copyright=payload.get("copyright", ""),
+        )
+    elif status in NO_COVERAGE_STATUSES:
+        metadata = _unresolved(status)
+    else:
+        # e.g. REQUEST_DENIED or OVER_QUERY_LIMIT: not an answer about coverage, so don't cache it
+        print(f"StreetView Metadata: Lookup returned {status}: {payload.get('error_message', '')}")
+        return _unresolved(status)
+
+    if recording:
+        archive.put(archive_key, "metadata", params, json.dumps(payload).encode("utf-8"), status, "application/json")
+
+    with _metadata_cache_lock:
+        _metadata_cache[cache_key] = (metadata, time.time())
+        _metadata_cache.move_to_end(cache_key)
+        while len(_metadata_cache) > _MAX_CACHED_LOCATIONS:
+            _metadata_cache.popitem(last=False)
+
+    return metadata
+
+
+def preflight_panorama(api_key, location, pano_id=""):
+    """
+    Resolves the panorama a node is about to fetch, before any billed request.
+
+    Nodes use the result to skip all image requests when `no_coverage` is set,
+    and pass `pano_id` to every request when `ok` is set, so all faces and frames
+    come from the same capture. Set STREETVIEW_METADATA_PREFLIGHT=0 to turn the
+    lookup off (the result then has status "DISABLED" and nodes behave as before).
+    """
+    if not _preflight_enabled():
+        return _unresolved("DISABLED")
+    return fetch_pano_metadata(api_key, location, pano_id)
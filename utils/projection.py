@@ -0,0 +1,505 @@
+# file: ComfyUI_StreetView-Loader/utils/projection.py
+
+import functools
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+# The six 90° FOV views that together cover the full sphere, as (heading, pitch).
+# Same orientations as the StreetViewEquirectangularLoader faces, in a fixed index order.
+CUBE_FACE_NAMES = ("front", "right", "back", "left", "top", "bottom")
+CUBE_FACE_ORIENTATIONS = {
+    "front": (0, 0),
+    "right": (90, 0),
+    "back": (180, 0),
+    "left": (270, 0),
+    "top": (0, 90),
+    "bottom": (0, -90),
+}
+
+# cv2.remap only accepts maps smaller than 32767 in each dimension, so scattered
+# sample points are laid out in rows of this width before remapping.
+_REMAP_ROW_WIDTH = 1024
+
+# Output pixels of the equirect tables computed per band (see equirect_cube_tables)
+_EQUIRECT_BAND_PIXELS = 1 << 20
+
+# Precomputed cube -> equirectangular projection geometry (see equirect_cube_tables)
+EquirectTables = namedtuple("EquirectTables", ["face_index", "map_x", "map_y", "face_pixels"])
+
+# Precomputed known-geometry panorama stitch (see pano_stitch_tables). Each view
+# covers the canvas region [y0:y0+h, x0:x0+w], where h, w is the shape of its weight.
+# map1/map2 are fixed-point cv2.remap maps (cv2.convertMaps, CV_16SC2).
+PanoStitchTables = namedtuple("PanoStitchTables", ["canvas_width", "canvas_height", "views"])
+PanoStitchView = namedtuple("PanoStitchView", ["x0", "y0", "map1", "map2", "weight"])
+
+# One request of a tiled cube face capture (see face_tile_plan)
+FaceTile = namedtuple("FaceTile", ["row", "col", "heading", "pitch", "fov", "map1", "map2"])
+
+_CV2_INTERPOLATION = {
+    "NEAREST": cv2.INTER_NEAREST,
+    "BILINEAR": cv2.INTER_LINEAR,
+    "BICUBIC": cv2.INTER_CUBIC,
+}
+
+
+def camera_basis(heading, pitch):
+    """
+    Returns the (forward, right, up) unit vectors of a Street View camera.
+
+    World axes: +X east, +Y up, +Z north. Heading is clockwise from north and
+    pitch is positive upwards, matching the Street View Static API. The camera
+    has no roll, so `right` always stays horizontal.
+    """
+    h = np.radians(heading)
+    p = np.radians(pitch)
+    forward = np.array([np.cos(p) * np.sin(h), np.sin(p), np.cos(p) * np.cos(h)])
+    right = np.array([np.cos(h), 0.0, -np.sin(h)])
+    up = np.cross(forward, right)
+    return forward, right, up
+
+
+def perspective_rays(heading, pitch, fov, width, height):
+    """
+    Returns an array of shape (height, width, 3) with the (unnormalized) viewing
+    direction through the center of every pixel of a pinhole camera.
+    `fov` is the horizontal field of view in degrees, as in the Street View API.
+    """
+    forward, right, up = camera_basis(heading, pitch)
+    tan_half = np.tan(np.radians(fov) / 2.0)
+
+    xs = ((np.arange(width, dtype=np.float32) + 0.5) / width * 2.0 - 1.0) * tan_half
+    ys = (1.0 - (np.arange(height, dtype=np.float32) + 0.5) / height * 2.0) * tan_half * (height / width)
+
+    rays = forward.astype(np.float32)[None, None, :] \
+        + xs[None, :, None] * right.astype(np.float32)[None, None, :] \
+        + ys[:, None, None] * up.astype(np.float32)[None, None, :]
+    return rays
+
+
+def cube_lookup(directions, face_size):
+    """
+    Maps viewing directions onto the six CUBE_FACE_ORIENTATIONS views.
+
+    Args:
+        directions: Array of shape (..., 3) of viewing directions.
+        face_size: Side length in pixels of the (square) face images.
+
+    Returns:
+        A tuple (face_index, map_x, map_y): an int8 index into CUBE_FACE_NAMES and
+        float32 pixel coordinates (pixel-center convention) inside that face image,
+        exactly as the raw API image for that face is laid out.
+    """
+    bases = [camera_basis(*CUBE_FACE_ORIENTATIONS[name]) for name in CUBE_FACE_NAMES]
+    forwards = np.stack([b[0] for b in bases]).astype(np.float32)
+    rights = np.stack([b[1] for b in bases]).astype(np.float32)
+    ups = np.stack([b[2] for b in bases]).astype(np.float32)
+
+    directions = directions.astype(np.float32, copy=False)
+
+    # The face whose forward axis is closest to the direction is the one that sees it
+    face_index = np.argmax(directions @ forwards.T, axis=-1).astype(np.int8)
+
+    depth = np.einsum("...k,...k->...", directions, forwards[face_index])
+    u = np.einsum("...k,...k->...", directions, rights[face_index]) / depth
+    v = -np.einsum("...k,...k->...", directions, ups[face_index]) / depth
+
+    map_x = ((u + 1.0) * 0.5 * face_size - 0.5).astype(np.float32)
+    map_y = ((v + 1.0) * 0.5 * face_size - 0.5).astype(np.float32)
+    return face_index, map_x, map_y
+
+
+def remap_points(image, map_x, map_y, interpolation="BILINEAR"):
+    """
+    Samples `image` at the scattered float pixel coordinates (map_x, map_y).
+
+    Uses cv2.remap as the sampling kernel; coordinates outside the image are
+    clamped to its edge pixels. Returns an array of shape (len(map_x), channels).
+    """
+    count = map_x.size
+    rows = max(1, -(-count // _REMAP_ROW_WIDTH))
+    padded = rows * _REMAP_ROW_WIDTH
+
+    grid_x = np.zeros(padded, dtype=np.float32)
+    grid_y = np.zeros(padded, dtype=np.float32)
+    grid_x[:count] = map_x
+    grid_y[:count] = map_y
+
+    sampled = cv2.remap(
+        image,
+        grid_x.reshape(rows, _REMAP_ROW_WIDTH),
+        grid_y.reshape(rows, _REMAP_ROW_WIDTH),
+        _CV2_INTERPOLATION.get(interpolation, cv2.INTER_LINEAR),
+        borderMode=cv2.BORDER_REPLICATE,
+    )
+    return sampled.reshape(padded, -1)[:count]
+
+
+def remap_cube_faces(faces, face_index, map_x, map_y, interpolation="BILINEAR", out=None, face_pixels=None):
+    """
+    Gathers an output image from a set of face images using a per-pixel face
+    index and per-pixel sample coordinates (as produced by cube_lookup).
+
+    Args:
+        faces: Sequence of uint8 face images of shape (S, S, 3), indexed like face_index.
+        face_index, map_x, map_y: Arrays of the output shape (H, W).
+        interpolation: "NEAREST", "BILINEAR" or "BICUBIC".
+        out: Optional preallocated C-contiguous uint8 array of shape (H, W, 3) to write into.
+        face_pixels: Optional precomputed flat output indices of every face (skips the per-call search).
+
+    Returns:
+        The output image of shape (H, W, 3).
+    """
+    if out is None:
+        out = np.empty(face_index.shape + (3,), dtype=np.uint8)
+
+    flat_out = out.reshape(-1, 3)
+    flat_index = face_index.ravel()
+    flat_x = map_x.ravel()
+    flat_y = map_y.ravel()
+
+    for i, face in enumerate(faces):
+        selected = face_pixels[i] if face_pixels is not None else np.flatnonzero(flat_index == i)
+        if selected.size == 0:
+            continue
+        flat_out[selected] = remap_points(face, flat_x[selected], flat_y[selected], interpolation)
+
+    return out
+
+
+def render_perspective_from_cube(faces, heading, pitch, fov, width, height, interpolation="BILINEAR", out=None):
+    """
+    Renders a perspective view (heading, pitch, fov) of size width x height from
+    the six raw API face images in CUBE_FACE_NAMES order.
+    """
+    rays = perspective_rays(heading, pitch, fov, width, height)
+    face_index, map_x, map_y = cube_lookup(rays, faces[0].shape[0])
+    return remap_cube_faces(faces, face_index, map_x, map_y, interpolation, out)
+
+
+def _equirect_band(cos_lat, sin_lat, sin_lon, cos_lon, cube_side, face_index, map_x, map_y):
+    """
+    Fills one band of rows of the equirect_cube_tables arrays. cos_lat/sin_lat
+    are float32 columns (rows, 1) and sin_lon/cos_lon float32 rows (width,).
+    """
+    face_ids = {name: i for i, name in enumerate(CUBE_FACE_NAMES)}
+
+    # Convert spherical to Cartesian coordinates
+    x_cart = cos_lat * sin_lon
+    y_cart = np.broadcast_to(sin_lat, x_cart.shape)
+    z_cart = cos_lat * cos_lon
+
+    abs_x = np.abs(x_cart)
+    abs_y = np.abs(y_cart)
+    abs_z = np.abs(z_cart)
+
+    # Determine which face each pixel maps to. On ties the later axis wins (Z over Y over X).
+    face_mask_x = (abs_x >= abs_y) & (abs_x >= abs_z)
+    face_mask_y = (abs_y >= abs_x) & (abs_y >= abs_z)
+    face_mask_z = (abs_z >= abs_x) & (abs_z >= abs_y)
+
+    u_coords = np.zeros(x_cart.shape, dtype=np.float32)
+    v_coords = np.zeros(x_cart.shape, dtype=np.float32)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # X-axis faces: +X maps to the back face, -X to the front face
+        mask = face_mask_x & (x_cart > 0)
+        face_index[mask] = face_ids["back"]
+        u_coords[mask] = -z_cart[mask] / x_cart[mask]
+        v_coords[mask] = y_cart[mask] / x_cart[mask]
+        mask = face_mask_x & (x_cart <= 0)
+        face_index[mask] = face_ids["front"]
+        u_coords[mask] = z_cart[mask] / x_cart[mask]
+        v_coords[mask] = y_cart[mask] / x_cart[mask]
+
+        # Y-axis faces (top/bottom)
+        mask = face_mask_y & (y_cart > 0)
+        face_index[mask] = face_ids["top"]
+        u_coords[mask] = x_cart[mask] / y_cart[mask]
+        v_coords[mask] = -z_cart[mask] / y_cart[mask]
+        mask = face_mask_y & (y_cart <= 0)
+        face_index[mask] = face_ids["bottom"]
+        u_coords[mask] = x_cart[mask] / y_cart[mask]
+        v_coords[mask] = z_cart[mask] / y_cart[mask]
+
+        # Z-axis faces: +Z maps to the right face, -Z to the left face
+        mask = face_mask_z & (z_cart > 0)
+        face_index[mask] = face_ids["right"]
+        u_coords[mask] = x_cart[mask] / z_cart[mask]
+        v_coords[mask] = y_cart[mask] / z_cart[mask]
+        mask = face_mask_z & (z_cart <= 0)
+        face_index[mask] = face_ids["left"]
+        u_coords[mask] = -x_cart[mask] / z_cart[mask]
+        v_coords[mask] = y_cart[mask] / z_cart[mask]
+
+    # Clamp UV coordinates to the valid range [-1, 1] and convert to pixel coordinates (pixel-center convention)
+    half_side = np.float32(0.5 * cube_side)
+    map_x[...] = np.clip(u_coords, -1, 1) * half_side + (half_side - np.float32(0.5))
+    map_y[...] = np.clip(v_coords, -1, 1) * half_side + (half_side - np.float32(0.5))
+
+
+def equirect_cube_tables(cube_side, equi_width, equi_height):
+    """
+    Computes where every equirectangular output pixel samples the six faces of
+    StreetViewEquirectangularLoader.
+
+    The faces are expected after that node's orientation fix-ups, indexed in
+    CUBE_FACE_NAMES order. This is the expensive part of a conversion and depends
+    only on the sizes, so it is cached by utils/warp_cache.py. The tables are
+    computed in float32, _EQUIRECT_BAND_PIXELS at a time, so the temporaries
+    stay small next to the tables themselves (13 bytes per output pixel).
+    Arrays are read-only.
+
+    Returns:
+        EquirectTables with arrays of shape (equi_height, equi_width):
+            face_index    - int8 index into CUBE_FACE_NAMES
+            map_x, map_y  - float32 sample coordinates in the face (pixel-center convention)
+        and face_pixels, a tuple with the flat int32 output pixel indices covered by each face.
+    """
+    face_index = np.empty((equi_height, equi_width), dtype=np.int8)
+    map_x = np.empty((equi_height, equi_width), dtype=np.float32)
+    map_y = np.empty((equi_height, equi_width), dtype=np.float32)
+
+    # Longitude of every column and latitude of every row; only these 1-D arrays use float64
+    lon = (np.arange(equi_width) / equi_width - 0.5) * 2 * np.pi
+    lat = (0.5 - np.arange(equi_height) / equi_height) * np.pi
+    sin_lon, cos_lon = np.sin(lon).astype(np.float32), np.cos(lon).astype(np.float32)
+    sin_lat, cos_lat = np.sin(lat).astype(np.float32)[:, None], np.cos(lat).astype(np.float32)[:, None]
+
+    band_rows = max(1, _EQUIRECT_BAND_PIXELS // equi_width)
+    bands = [slice(y0, min(y0 + band_rows, equi_height)) for y0 in range(0, equi_height, band_rows)]
+    counts = np.zeros(len(CUBE_FACE_NAMES), dtype=np.int64)
+    for band in bands:
+        _equirect_band(cos_lat[band], sin_lat[band], sin_lon, cos_lon, cube_side, face_index[band], map_x[band], map_y[band])
+        counts += np.bincount(face_index[band].ravel(), minlength=len(CUBE_FACE_NAMES))
+
+    # Flat output indices of every face, gathered band by band into exactly sized int32 arrays
+    face_pixels = tuple(np.empty(count, dtype=np.int32) for count in counts)
+    filled = [0] * len(CUBE_FACE_NAMES)
+    for band in bands:
+        flat_band = face_index[band].ravel()
+        for i, pixels in enumerate(face_pixels):
+            selected = np.flatnonzero(flat_band == i)
+            pixels[filled[i]:filled[i] + selected.size] = selected + band.start * equi_width
+            filled[i] += selected.size
+
+    tables = EquirectTables(face_index, map_x, map_y, face_pixels)
+    for array in tables[:3] + tables.face_pixels:
+        array.setflags(write=False)
+    return tables
+
+
+def equirect_nearest_index(tables, cube_side):
+    """
+    Returns the int32 flat index into the stacked (6, S, S) faces of the nearest
+    sample of every pixel of `tables` (see equirect_cube_tables), for NEAREST
+    sampling. Only built when that mode is used. The array is read-only.
+    """
+    nearest_index = tables.face_index.astype(np.int32)
+    for axis in (tables.map_y, tables.map_x):
+        nearest_index *= cube_side
+        nearest_index += np.clip(axis + np.float32(0.5), 0, cube_side - 1).astype(np.int32)
+    nearest_index.setflags(write=False)
+    return nearest_index
+
+
+def _view_angle_bounds(heading, pitch, fov, width, height):
+    """
+    Returns (yaw_min, yaw_max, elevation_min, elevation_max) in radians of the
+    directions seen by a perspective view, with yaw relative to heading 0.
+    """
+    rays = perspective_rays(heading, pitch, fov, width, height)
+    border = np.concatenate([rays[0], rays[-1], rays[:, 0], rays[:, -1]])
+    yaw = np.arctan2(border[:, 0], border[:, 2])
+    elevation = np.arctan2(border[:, 1], np.hypot(border[:, 0], border[:, 2]))
+    yaw_min, yaw_max = float(yaw.min()), float(yaw.max())
+    elevation_min, elevation_max = float(elevation.min()), float(elevation.max())
+
+    # A view that crosses the back of the canvas, or contains a pole, sees every yaw
+    if (yaw < -np.pi / 2).any() and (yaw > np.pi / 2).any():
+        yaw_min, yaw_max = -np.pi, np.pi
+    half_vertical_fov = np.degrees(np.arctan(np.tan(np.radians(fov) / 2.0) * height / width))
+    if pitch + half_vertical_fov >= 90.0:
+        yaw_min, yaw_max, elevation_max = -np.pi, np.pi, np.pi / 2
+    if pitch - half_vertical_fov <= -90.0:
+        yaw_min, yaw_max, elevation_min = -np.pi, np.pi, -np.pi / 2
+    return yaw_min, yaw_max, elevation_min, elevation_max
+
+
+def pano_stitch_tables(heading_offsets, pitch, fov, width, height):
+    """
+    Computes the known-geometry stitch of perspective views that share a camera
+    position, pitch and fov and differ only in heading.
+
+    The views are projected onto a spherical canvas (columns are linear in yaw,
+    rows linear in elevation) centered on heading 0, at the resolution of the
+    source images at their center. Overlaps are feather-blended: every view's
+    weight falls off linearly towards its image edges, and the weights of all
+    views are normalized to sum to 1 on every covered canvas pixel.
+
+    Args:
+        heading_offsets: Heading of every view in degrees, relative to the canvas center.
+        pitch, fov: Shared camera pitch and horizontal field of view in degrees.
+        width, height: Size of the source images.
+
+    This is the expensive part of a stitch and depends only on the layout, so
+    it is cached per layout by utils/warp_cache.py.
+
+    Returns:
+        PanoStitchTables; views are in heading_offsets order. Arrays are read-only.
+    """
+    tan_x = np.tan(np.radians(fov) / 2.0)
+    tan_y = tan_x * height / width
+    focal = (width / 2.0) / tan_x    # canvas pixels per radian
+
+    bounds = np.array([_view_angle_bounds(offset, pitch, fov, width, height) for offset in heading_offsets])
+    yaw_min, yaw_max = max(bounds[:, 0].min(), -np.pi), min(bounds[:, 1].max(), np.pi)
+    elevation_min, elevation_max = max(bounds[:, 2].min(), -np.pi / 2), min(bounds[:, 3].max(), np.pi / 2)
+
+    canvas_width = max(1, int(round((yaw_max - yaw_min) * focal)))
+    canvas_height = max(1, int(round((elevation_max - elevation_min) * focal)))
+
+    yaw = (yaw_min + (np.arange(canvas_width, dtype=np.float32) + 0.5) / focal).astype(np.float32)
+    elevation = (elevation_max - (np.arange(canvas_height, dtype=np.float32) + 0.5) / focal).astype(np.float32)
+    cos_elevation = np.cos(elevation)[:, None]
+    directions = np.stack(np.broadcast_arrays(
+        cos_elevation * np.sin(yaw)[None, :],
+        np.sin(elevation)[:, None],
+        cos_elevation * np.cos(yaw)[None, :],
+    ), axis=-1)
+
+    maps = []
+    weights = []
+    for offset in heading_offsets:
+        forward, right, up = (axis.astype(np.float32) for axis in camera_basis(offset, pitch))
+        depth = directions @ forward
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u = (directions @ right) / depth
+            v = -(directions @ up) / depth
+        inside = (depth > 1e-6) & (np.abs(u) <= tan_x) & (np.abs(v) <= tan_y)
+        feather = np.clip(1.0 - np.abs(u) / tan_x, 1e-3, 1.0) * np.clip(1.0 - np.abs(v) / tan_y, 1e-3, 1.0)
+        weights.append(np.where(inside, feather, 0.0).astype(np.float32))
+        maps.append((
+            ((u / tan_x + 1.0) * 0.5 * width - 0.5).astype(np.float32),
+            ((v / tan_y + 1.0) * 0.5 * height - 0.5).astype(np.float32),
+        ))
+
+    total = np.sum(weights, axis=0)
+    covered = total > 0
+
+    views = []
+    for (map_x, map_y), weight in zip(maps, weights):
+        np.divide(weight, total, out=weight, where=covered)
+        # Every view sees its own center, which the canvas always contains, so the region is never empty
+        rows = np.flatnonzero(weight.any(axis=1))
+        cols = np.flatnonzero(weight.any(axis=0))
+        region = (slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+        # Fixed-point maps are smaller and remap faster than float maps, at 1/32 pixel precision
+        map1, map2 = cv2.convertMaps(np.ascontiguousarray(map_x[region]), np.ascontiguousarray(map_y[region]), cv2.CV_16SC2)
+        view = PanoStitchView(
+            x0=int(region[1].start),
+            y0=int(region[0].start),
+            map1=map1,
+            map2=map2,
+            weight=np.ascontiguousarray(weight[region]),
+        )
+        for array in view[2:]:
+            array.setflags(write=False)
+        views.append(view)
+
+    return PanoStitchTables(canvas_width, canvas_height, tuple(views))
+
+
+def blend_pano_views(images, tables):
+    """
+    Warps and blends perspective views onto the canvas of `tables` (see pano_stitch_tables).
+
+    Args:
+        images: uint8 images of shape (H, W, 3), in the order of tables.views.
+                None marks a view that could not be fetched; the weights of the
+                remaining views are renormalized, so its region is filled by
+                its neighbours where they overlap and stays black elsewhere.
+
+    Returns:
+        The uint8 panorama of shape (canvas_height, canvas_width, 3).
+    """
+    canvas = np.zeros((tables.canvas_height, tables.canvas_width, 3), dtype=np.float32)
+    coverage = None
+    if any(image is None for image in images):
+        coverage = np.zeros((tables.canvas_height, tables.canvas_width), dtype=np.float32)
+
+    for image, view in zip(images, tables.views):
+        if image is None:
+            continue
+        h, w = view.weight.shape
+        warped = cv2.remap(image, view.map1, view.map2, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        region = canvas[view.y0:view.y0 + h, view.x0:view.x0 + w]
+        region += warped * view.weight[..., None]
+        if coverage is not None:
+            coverage[view.y0:view.y0 + h, view.x0:view.x0 + w] += view.weight
+
+    if coverage is not None:
+        np.divide(canvas, coverage[..., None], out=canvas, where=coverage[..., None] > 0)
+
+    # The normalized weights make every pixel a convex combination, so it stays within [0, 255]
+    canvas += 0.5
+    return canvas.astype(np.uint8)
+
+
+@functools.lru_cache(maxsize=16)
+def face_tile_plan(face_heading, face_pitch, grid, tile_size):
+    """
+    Plans the capture of one 90° cube face as a grid x grid mosaic of
+    narrower-fov requests, for faces larger than the API's 640 px limit.
+
+    The face (laid out like the raw API image at face_heading/face_pitch, fov 90)
+    is split into grid x grid cells of tile_size pixels. Each cell is fetched as
+    its own square view with the camera pointed at the cell center and a fov
+    just wide enough to cover the cell. Street View cameras have no roll, so
+    off-center tiles are not parallel to the face plane; every tile is therefore
+    reprojected into its cell rather than pasted.
+
+    Returns:
+        A tuple of FaceTile in row-major order. map1/map2 are fixed-point
+        cv2.remap maps that sample the tile image for its tile_size x tile_size
+        cell. Results are kept in a small LRU cache and are read-only.
+    """
+    face_size = grid * tile_size
+    forward, right, up = camera_basis(face_heading, face_pitch)
+    # Face-plane coordinates (tangent of the angle) of the pixel centers along either axis
+    coords = (np.arange(face_size) + 0.5) / face_size * 2.0 - 1.0
+
+    tiles = []
+    for row in range(grid):
+        ys = -coords[row * tile_size:(row + 1) * tile_size]  # image rows go downwards
+        for col in range(grid):
+            xs = coords[col * tile_size:(col + 1) * tile_size]
+            directions = forward + xs[None, :, None] * right + ys[:, None, None] * up
+
+            center = forward + ((2 * col + 1) / grid - 1.0) * right - ((2 * row + 1) / grid - 1.0) * up
+            horizontal = np.hypot(center[0], center[2])
+            heading = float(np.degrees(np.arctan2(center[0], center[2])) % 360) if horizontal > 1e-9 else float(face_heading)
+            pitch = float(np.degrees(np.arctan2(center[1], horizontal)))
+            heading, pitch = round(heading, 3), round(pitch, 3)
+
+            tile_forward, tile_right, tile_up = camera_basis(heading, pitch)
+            depth = directions @ tile_forward
+            u = (directions @ tile_right) / depth
+            v = -(directions @ tile_up) / depth
+
+            # Wide enough for the whole cell, plus a pixel of margin for the interpolation filter
+            tan_half = max(np.abs(u).max(), np.abs(v).max()) * (1.0 + 2.0 / tile_size)
+            fov = float(np.ceil(np.degrees(2.0 * np.arctan(tan_half)) * 10.0) / 10.0)
+            tan_half = np.tan(np.radians(fov) / 2.0)
+
+            map1, map2 = cv2.convertMaps(
+                ((u / tan_half + 1.0) * 0.5 * tile_size - 0.5).astype(np.float32),
+                ((v / tan_half + 1.0) * 0.5 * tile_size - 0.5).astype(np.float32),
+                cv2.CV_16SC2,
+            )
+            map1.setflags(write=False)
+            map2.setflags(write=False)
+            tiles.append(FaceTile(row, col, heading, pitch, fov, map1, map2))
+
+    return tuple(tiles)
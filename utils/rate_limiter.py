@@ -0,0 +1,122 @@
+# file: ComfyUI_StreetView-Loader/utils/rate_limiter.py
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class QuotaExceededError(RuntimeError):
+    """ Raised when the configured daily Street View request budget is used up. """
+
+
+class RateLimiter:
+    """
+    A process-wide token-bucket rate limiter with a daily request budget.
+
+    Callers are served strictly first-come, first-served: each `acquire()` takes
+    a ticket and waits for its turn, then waits for a token. This queues bursts
+    from several nodes fairly instead of letting them fail at the API.
+    The daily budget resets at midnight UTC; once it is spent `acquire()` fails
+    fast with QuotaExceededError instead of sending requests that would be rejected.
+    """
+
+    def __init__(self, max_qps=0.0, burst=None, daily_budget=0):
+        self.max_qps = max_qps
+        self.burst = burst if burst is not None else max(1.0, max_qps)
+        self.daily_budget = daily_budget
+
+        self._lock = threading.Lock()
+        self._turn = threading.Condition(threading.Lock())
+        self._next_ticket = 0
+        self._now_serving = 0
+
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._budget_day = self._today()
+        self._used_today = 0
+
+    @staticmethod
+    def _today():
+        return datetime.now(timezone.utc).date()
+
+    def _reserve_budget(self):
+        with self._lock:
+            today = self._today()
+            if today != self._budget_day:
+                self._budget_day = today
+                self._used_today = 0
+            if self.daily_budget > 0 and self._used_today >= self.daily_budget:
+                raise QuotaExceededError(
+                    f"Street View daily request budget of {self.daily_budget} requests is exhausted "
+                    f"(resets at 00:00 UTC). Raise STREETVIEW_DAILY_BUDGET in the .env file to allow more requests."
+                )
+            self._used_today += 1
+
+    def _take_token(self):
+        """ Returns 0 if a token was taken, otherwise the number of seconds until one is available. """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.max_qps)
+            self._last_refill = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.max_qps
+
+    def acquire(self):
+        """ Blocks until the caller may send one billed request. """
+        with self._turn:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._now_serving:
+                self._turn.wait()
+
+        try:
+            self._reserve_budget()
+            if self.max_qps > 0:
+                wait = self._take_token()
+                while wait > 0:
+                    time.sleep(wait)
+                    wait = self._take_token()
+        finally:
+            with self._turn:
+                self._now_serving += 1
+                self._turn.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_qps": self.max_qps,
+                "daily_budget": self.daily_budget,
+                "used_today": self._used_today,
+                "queued": self._next_ticket - self._now_serving,
+            }
+
+
+# --- Process-wide instance, configured from the environment (.env) ---
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Returns the shared RateLimiter instance used for every billed image request.
+
+    Configuration (environment variables):
+        STREETVIEW_MAX_QPS       - sustained requests per second, 0 = unlimited (default 0)
+        STREETVIEW_BURST         - requests allowed in a burst (default: max(1, STREETVIEW_MAX_QPS))
+        STREETVIEW_DAILY_BUDGET  - billed requests allowed per UTC day, 0 = unlimited (default 0)
+    """
+    global _rate_limiter
+
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            burst = os.getenv("STREETVIEW_BURST")
+            _rate_limiter = RateLimiter(
+                max_qps=float(os.getenv("STREETVIEW_MAX_QPS", "0")),
+                burst=float(burst) if burst else None,
+                daily_budget=int(os.getenv("STREETVIEW_DAILY_BUDGET", "0")),
+            )
+
+    return _rate_limiter
@@ -0,0 +1,227 @@
+# file: ComfyUI_StreetView-Loader/utils/warp_cache.py
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .metrics import get_metrics
+from .projection import PanoStitchTables, PanoStitchView, pano_stitch_tables, equirect_cube_tables, equirect_nearest_index
+
+# Bump when the stitch geometry or the table layout changes, so stale files on disk are ignored
+WARP_TABLES_VERSION = 1
+
+
+def _tables_nbytes(tables):
+    """ Bytes held by the arrays of a tables namedtuple, nested tuples included. """
+    if isinstance(tables, np.ndarray):
+        return tables.nbytes
+    if isinstance(tables, tuple):
+        return sum(_tables_nbytes(item) for item in tables)
+    return 0
+
+
+def save_stitch_tables(path, tables):
+    """ Atomically writes PanoStitchTables to an uncompressed .npz file. """
+    arrays = {
+        "canvas_size": np.array([tables.canvas_width, tables.canvas_height], dtype=np.int64),
+        "offsets": np.array([[view.x0, view.y0] for view in tables.views], dtype=np.int64),
+    }
+    for i, view in enumerate(tables.views):
+        arrays[f"map1_{i}"] = view.map1
+        arrays[f"map2_{i}"] = view.map2
+        arrays[f"weight_{i}"] = view.weight
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_stitch_tables(path):
+    """ Reads PanoStitchTables written by save_stitch_tables. """
+    with np.load(path, allow_pickle=False) as data:
+        canvas_width, canvas_height = (int(v) for v in data["canvas_size"])
+        views = []
+        for i, (x0, y0) in enumerate(data["offsets"]):
+            view = PanoStitchView(int(x0), int(y0), data[f"map1_{i}"], data[f"map2_{i}"], data[f"weight_{i}"])
+            for array in view[2:]:
+                array.setflags(write=False)
+            views.append(view)
+    return PanoStitchTables(canvas_width, canvas_height, tuple(views))
+
+
+class WarpMapCache:
+    """
+    A process-wide LRU cache of projection tables, keyed by layout: panorama
+    stitch tables (remap maps and blend weights, see projection.pano_stitch_tables)
+    and equirectangular remap tables (see projection.equirect_cube_tables).
+
+    Workflows tend to reuse a few layouts across many locations, and the tables
+    only depend on the layout, so after the first image of a layout every
+    projection is a pure remap. The cache is bounded by the bytes held; tables
+    larger than the whole budget are not kept. When a directory is given,
+    stitch tables are also stored there as .npz files, so they survive a
+    restart and are shared between processes.
+    """
+
+    def __init__(self, max_bytes, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> tables, oldest first
+        self._total_bytes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha256(json.dumps([WARP_TABLES_VERSION, key]).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"pano_{digest[:32]}.npz")
+
+    def get(self, key, persist=True):
+        """ Returns the tables for the key from memory or (with persist) disk, or None on a miss. """
+        with self._lock:
+            tables = self._entries.get(key)
+            if tables is not None:
+                self._entries.move_to_end(key)
+                get_metrics().increment("cache_hits", level="warp")
+                return tables
+
+        if persist and self.directory:
+            try:
+                tables = load_stitch_tables(self._path(key))
+            except FileNotFoundError:
+                tables = None
+            except (OSError, ValueError, KeyError) as e:
+                print(f"StreetView Warp Cache: Ignoring unreadable tables file: {e}")
+                tables = None
+            if tables is not None:
+                get_metrics().increment("cache_hits", level="warp_disk")
+                self._store(key, tables)
+                return tables
+
+        return None
+
+    def put(self, key, tables, persist=True):
+        """ Stores the tables; persist=False keeps them in memory only (no .npz file). """
+        self._store(key, tables)
+        if persist and self.directory:
+            try:
+                save_stitch_tables(self._path(key), tables)
+            except OSError as e:
+                print(f"StreetView Warp Cache: Could not store tables: {e}")
+
+    def _store(self, key, tables):
+        size = _tables_nbytes(tables)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= _tables_nbytes(previous)
+            self._entries[key] = tables
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= _tables_nbytes(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+# --- Process-wide instance, configured from the environment (.env) ---
+_warp_cache = None
+_warp_cache_lock = threading.Lock()
+
+
+def get_warp_cache():
+    """
+    Returns the shared WarpMapCache instance, or None if it is disabled.
+
+    Configuration (environment variables):
+        STREETVIEW_WARP_CACHE_MB   - byte budget in megabytes, 0 disables the cache (default 256)
+        STREETVIEW_WARP_CACHE_DIR  - also keep the tables as .npz files in this folder (default: memory only)
+    """
+    global _warp_cache
+
+    with _warp_cache_lock:
+        if _warp_cache is None:
+            max_bytes = int(float(os.getenv("STREETVIEW_WARP_CACHE_MB", "256")) * 1024 * 1024)
+            directory = os.getenv("STREETVIEW_WARP_CACHE_DIR") or None
+            if max_bytes <= 0:
+                _warp_cache = False
+            else:
+                try:
+                    _warp_cache = WarpMapCache(max_bytes, directory)
+                except OSError as e:
+                    print(f"StreetView Warp Cache: Disk storage disabled, could not use '{directory}': {e}")
+                    _warp_cache = WarpMapCache(max_bytes)
+
+    return _warp_cache if _warp_cache is not False else None
+
+
+def cached_pano_stitch_tables(heading_offsets, pitch, fov, width, height):
+    """
+    Returns projection.pano_stitch_tables for the layout, computing them only
+    the first time a layout is seen.
+    """
+    key = [[round(float(offset), 6) for offset in heading_offsets], round(float(pitch), 6), round(float(fov), 6), int(width), int(height)]
+    cache = get_warp_cache()
+    if cache is not None:
+        tables = cache.get(json.dumps(key))
+        if tables is not None:
+            return tables
+
+    get_metrics().increment("warp_table_builds")
+    tables = pano_stitch_tables(tuple(key[0]), key[1], key[2], key[3], key[4])
+    if cache is not None:
+        cache.put(json.dumps(key), tables)
+    return tables
+
+
+def cached_equirect_cube_tables(cube_side, equi_width, equi_height):
+    """
+    Returns projection.equirect_cube_tables for the sizes, computing them only
+    the first time the sizes are seen. Kept in memory only.
+    """
+    key = json.dumps(["equirect", int(cube_side), int(equi_width), int(equi_height)])
+    cache = get_warp_cache()
+    if cache is not None:
+        tables = cache.get(key, persist=False)
+        if tables is not None:
+            return tables
+
+    get_metrics().increment("warp_table_builds")
+    tables = equirect_cube_tables(int(cube_side), int(equi_width), int(equi_height))
+    if cache is not None:
+        cache.put(key, tables, persist=False)
+    return tables
+
+
+def cached_equirect_nearest_index(cube_side, equi_width, equi_height):
+    """ Returns projection.equirect_nearest_index for the sizes; built only when NEAREST sampling is used. """
+    key = json.dumps(["equirect_nearest", int(cube_side), int(equi_width), int(equi_height)])
+    cache = get_warp_cache()
+    if cache is not None:
+        nearest_index = cache.get(key, persist=False)
+        if nearest_index is not None:
+            return nearest_index
+
+    nearest_index = equirect_nearest_index(cached_equirect_cube_tables(cube_side, equi_width, equi_height), int(cube_side))
+    if cache is not None:
+        cache.put(key, nearest_index, persist=False)
+    return nearest_index